@@ -23,6 +23,7 @@ setuptools.setup(
     long_description_content_type="text/x-rst",
     url="https://github.com/facundobatista/unitconv",
     packages=setuptools.find_packages(),
+    py_modules=['unitconv_cli'],
     package_data={'': ["LICENSE", "requirements.txt"]},
     classifiers=[
         "Environment :: Console",
@@ -31,8 +32,8 @@ setuptools.setup(
         "Programming Language :: Python :: 3",
     ],
     entry_points={
-        'console_scripts': ["unitconv = unitconv:main"],
+        'console_scripts': ["unitconv = unitconv_cli:main"],
     },
-    python_requires='>=3',
+    python_requires='>=3.7',
     install_requires=requirements,
 )
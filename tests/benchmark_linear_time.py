@@ -0,0 +1,62 @@
+# Copyright 2020 Facundo Batista
+# All Rights Reserved
+
+"""Check that the conversion time grows linearly with the input.
+
+This is not part of the tests suite, as timings depend on the machine and its
+load; run it by hand after touching the lexer or the parser:
+
+    python tests/benchmark_linear_time.py
+"""
+
+import sys
+import time
+
+from mock import patch
+
+import unitconv
+
+# pathological inputs, built for a given size
+GENERATORS = {
+    'spaces': lambda n: '1' + ' ' * n + 'm',
+    'digits': lambda n: '1' * n,
+    'stars': lambda n: 'm' + '*' * n + '2',
+    'stars_spaced': lambda n: 'm ' + '** ' * (n // 3),
+    'carets': lambda n: '1 m' + ' ^' * (n // 2),
+    'superscripts': lambda n: '1 ' + 'a2' * (n // 2),
+    'multiword_prefixes': lambda n: '1 ' + 'sq ' * (n // 3),
+    'multiword_units': lambda n: '1 ' + 'cubic m ' * (n // 8),
+    'separators': lambda n: '1' + '.,' * (n // 2),
+    'exponents': lambda n: '1e1' * (n // 3),
+    'units': lambda n: '1 ' + 'm ' * (n // 2),
+}
+
+# being linear the time would grow 8 times, being quadratic 64 times
+SMALL, BIG = 2000, 16000
+MAX_RATIO = 24
+
+
+def _timeit(text):
+    """Return the best time of some conversions."""
+    times = []
+    for _ in range(3):
+        t0 = time.perf_counter()
+        unitconv.convert_result(text)
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def main():
+    """Time all the generators, return if all of them are linear."""
+    all_linear = True
+    with patch.object(unitconv, 'MAX_INPUT_LENGTH', None):
+        for name, generator in GENERATORS.items():
+            ratio = _timeit(generator(BIG)) / _timeit(generator(SMALL))
+            linear = ratio < MAX_RATIO
+            all_linear &= linear
+            print("{:20} {:6.1f} {}".format(name, ratio, "ok" if linear else "NOT LINEAR"))
+    return all_linear
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -4,14 +4,29 @@
 
 """Tests for the units converter."""
 
+import decimal
+import fractions
+import importlib
+import itertools
+import json
 import logging
+import os
+import pkgutil
 import random
+import subprocess
+import sys
+import tempfile
+import threading
 from io import StringIO
 from unittest import TestCase
 
 from mock import patch
 
 import unitconv
+import unitconv.client
+import unitconv.locales
+import unitconv_cli
+from unitconv import UnitInfo
 
 # store the logged globally to use when any of the check fail
 _l = unitconv.logger
@@ -42,6 +57,15 @@ class StructuresConsistencyTestCase(TestCase):
         miss = set(unitconv.SUGGESTED_SECOND_UNIT.values()) - set(unitconv.SUPPORTED_UNITS)
         self.assertFalse(miss, miss)
 
+    def test_suggestion_ladders(self):
+        all_units = list(itertools.chain(*unitconv.SUGGESTION_LADDERS))
+        self.assertEqual(len(all_units), len(set(all_units)))
+        miss = set(all_units) - set(unitconv.SUPPORTED_UNITS)
+        self.assertFalse(miss, miss)
+        for ladder in unitconv.SUGGESTION_LADDERS:
+            factors = [unitconv._conversion_factor(name, ladder[0]) for name in ladder]
+            self.assertEqual(factors, sorted(factors), ladder)
+
 
 class CheckingTestCase(TestCase):
     """Common code for all test cases."""
@@ -146,6 +170,7 @@ class BasicConversionsTestCase(CheckingTestCase):
             ("50 shades of gray", None),
             ("multimeters in yards", None),
             ("1 sq magnolia in square cm", None),
+            ("20 meters to", None),
         ])
 
     def test_not_only_ints(self):
@@ -273,6 +298,59 @@ class NumbersInfoTestCase(CheckingTestCase):
             "95 unit4 is about half of the dim4 of targ4",
         ])
 
+    def test_seeded(self):
+        data = [
+            (89, 'unit1', 'dim1', 'targ1'),
+            (12, 'unit2', 'dim2', 'targ2'),
+            (90, 'unit3', 'dim3', 'targ3'),
+            (180, 'unit4', 'dim4', 'targ4'),
+        ]
+        with patch.object(unitconv, 'NUMBERS_INFO', data):
+            with patch.object(random, 'choice') as mock_choice:
+                results = [unitconv.convert_result("95", seed=seed) for seed in range(6)]
+        mock_choice.assert_not_called()
+        self.assertTrue(all(result.deterministic for result in results))
+
+        # consecutive seeds rotate between the top 3
+        texts = [result.text for result in results]
+        self.assertEqual(texts[:3], texts[3:])
+        self.assertEqual(set(texts), {
+            "95 unit3 is close to the dim3 of targ3",
+            "95 unit1 is close to the dim1 of targ1",
+            "95 unit4 is about half of the dim4 of targ4",
+        })
+
+    def test_seeded_reproducible(self):
+        for number in ["7", "146", "1600", "20000"]:
+            self.assertEqual(unitconv.convert(number, seed=42), unitconv.convert(number, seed=42))
+
+    def test_seeded_any_type(self):
+        for seed in ["request-1234", 2.5, None]:
+            self.assertEqual(unitconv.convert("146", seed=seed).split()[0], "146")
+        self.assertEqual(unitconv.convert("146", seed="request-1234"),
+                         unitconv.convert("146", seed="request-1234"))
+
+    def test_candidates_buckets(self):
+        for number in itertools.chain(range(1, 3000), range(3000, 3000000, 997)):
+            candidates = unitconv._numbers_info_candidates(number)
+            for fact in unitconv.NUMBERS_INFO:
+                if fact[0] * .4 <= number <= fact[0] * 100:
+                    self.assertIn(fact, candidates, number)
+
+    def test_candidates_rebuilt(self):
+        unitconv._numbers_info_candidates(100)
+        data = [
+            (100, 'meters', 'size', 'a monster'),
+        ]
+        with patch.object(unitconv, 'NUMBERS_INFO', data):
+            self.assertEqual(unitconv._numbers_info_candidates(100), data)
+        self.assertNotEqual(unitconv._numbers_info_candidates(100), data)
+
+    def test_zero(self):
+        self.check([
+            ("0", None),
+        ])
+
     def test_number_only(self):
         data = [
             (100, 'meters', 'size', 'a monster'),
@@ -294,3 +372,788 @@ class NumbersInfoTestCase(CheckingTestCase):
             self.check([
                 ("200", "200 °C is around 2 times the temperature of boiling water"),
             ])
+
+
+class TokenizeTestCase(TestCase):
+    """Check the lexer."""
+
+    def test_kinds_and_spans(self):
+        tokens = unitconv.tokenize("how much is 20 inches in FEET?")
+        self.assertEqual(tokens, [
+            unitconv.Token('number', 20, 12, 14),
+            unitconv.Token('unit', 'inches', 15, 21),
+            unitconv.Token('connector', 'in', 22, 24),
+            unitconv.Token('unit', 'feet', 25, 29),
+        ])
+
+    def test_superscript_glued(self):
+        tokens = unitconv.tokenize("10 ft ** 2 to m²")
+        self.assertEqual(tokens, [
+            unitconv.Token('number', 10, 0, 2),
+            unitconv.Token('unit', 'ftSUPERSCRIPT_TWO', 3, 10),
+            unitconv.Token('connector', 'to', 11, 13),
+            unitconv.Token('unit', 'mSUPERSCRIPT_TWO', 14, 16),
+        ])
+
+    def test_superscript_alone(self):
+        tokens = unitconv.tokenize("5 ³")
+        self.assertEqual(tokens, [
+            unitconv.Token('number', 5, 0, 1),
+            unitconv.Token('superscript', 'SUPERSCRIPT_THREE', 2, 3),
+        ])
+
+    def test_multiword(self):
+        tokens = unitconv.tokenize("3 Metric Tons")
+        self.assertEqual(tokens, [
+            unitconv.Token('number', 3, 0, 1),
+            unitconv.Token('unit', 'metric_ton', 2, 13),
+        ])
+
+    def test_multiword_whole_words_only(self):
+        tokens = unitconv.tokenize("1 sq magnolia")
+        self.assertEqual(tokens, [unitconv.Token('number', 1, 0, 1)])
+
+    def test_unknown_words_ignored(self):
+        tokens = unitconv.tokenize("50 shades of gray")
+        self.assertEqual(tokens, [unitconv.Token('number', 50, 0, 2)])
+
+    def test_degree_symbol(self):
+        tokens = unitconv.tokenize("45°C")
+        self.assertEqual(tokens, [
+            unitconv.Token('number', 45, 0, 2),
+            unitconv.Token('unit', '°c', 2, 4),
+        ])
+
+
+class ShadowVerificationTestCase(TestCase):
+    """Check the fast path against pint."""
+
+    def test_all_supported_pairs(self):
+        divergences = unitconv.verify_conversions()
+        self.assertEqual(divergences, [])
+
+    def test_random_conversions(self):
+        # compare what the user would see, for many numbers and pairs of units
+        rnd = random.Random(42)
+        pairs = []
+        for name_from, name_to in itertools.product(unitconv.SUPPORTED_UNITS, repeat=2):
+            unit_from = UnitInfo(name_from, *unitconv.SUPPORTED_UNITS[name_from], None, None)
+            unit_to = UnitInfo(name_to, *unitconv.SUPPORTED_UNITS[name_to], None, None)
+            if unit_from.unit.dimensionality != unit_to.unit.dimensionality:
+                continue
+            if unitconv._pint_factor(name_from, name_to) is not None:
+                pairs.append((unit_from, unit_to))
+        for _ in range(5000):
+            unit_from, unit_to = rnd.choice(pairs)
+            number = round(rnd.uniform(0, 10 ** rnd.randint(0, 12)), rnd.randint(0, 6))
+            fast_result = unitconv._fast_convert(number, unit_from, unit_to)
+            divergence = unitconv._shadow.verify(None, number, unit_from, unit_to, fast_result)
+            self.assertIsNone(divergence)
+
+    def test_same_text_than_pint(self):
+        self.assertEqual(unitconv.convert("895 ton in mg"),
+                         "895 short tons = 811930342300 milligrams")
+
+    def test_text_divergence_detected(self):
+        unit_from = UnitInfo('meter', *unitconv.SUPPORTED_UNITS['meter'], None, None)
+        unit_to = UnitInfo('centimeter', *unitconv.SUPPORTED_UNITS['centimeter'], None, None)
+        self.assertIsNone(unitconv._shadow.verify(None, 2, unit_from, unit_to, 200.000000001))
+        divergence = unitconv._shadow.verify(None, 2, unit_from, unit_to, 200.0001)
+        self.assertEqual(divergence.fast, 200.0001)
+
+    def test_no_sampling_by_default(self):
+        with patch.object(unitconv._shadow, 'submit') as mock_submit:
+            unitconv.convert("2 meter in cm")
+        mock_submit.assert_not_called()
+
+    def test_divergence_recorded(self):
+        unitconv.shadow_divergences.clear()
+        with patch.object(unitconv, 'SHADOW_SAMPLE_RATE', 1):
+            with patch.object(unitconv, '_pint_factor', lambda f, t: 2.0):
+                result = unitconv.convert("2 meter in cm")
+            unitconv._shadow._queue.join()
+        self.assertEqual(result, "2 meters = 4 centimeters")
+        (divergence,) = unitconv.shadow_divergences
+        self.assertEqual(divergence.query, "2 meter in cm")
+        self.assertEqual(divergence.unit_from, 'meter')
+        self.assertEqual(divergence.unit_to, 'centimeter')
+        self.assertEqual(divergence.fast, 4)
+        self.assertEqual(divergence.reference, 200)
+
+    def test_no_divergence(self):
+        unitconv.shadow_divergences.clear()
+        with patch.object(unitconv, 'SHADOW_SAMPLE_RATE', 1):
+            unitconv.convert("3lb in mg")
+            unitconv._shadow._queue.join()
+        self.assertEqual(len(unitconv.shadow_divergences), 0)
+
+
+class FailureReasonTestCase(TestCase):
+    """Check the structured result and its failure reasons."""
+
+    def check(self, operations):
+        for inp, reason in operations:
+            result = unitconv.convert_result(inp)
+            self.assertIsNone(result.text, inp)
+            self.assertEqual(result.failure, reason, inp)
+
+    def test_success(self):
+        result = unitconv.convert_result("2 meter in cm")
+        self.assertEqual(result.text, "2 meters = 200 centimeters")
+        self.assertIsNone(result.failure)
+
+    def test_reasons(self):
+        data = [
+            (100, 'meters', 'size', 'a monster'),
+        ]
+        with patch.object(unitconv, 'NUMBERS_INFO', data):
+            self.check([
+                ("meters in inches", unitconv.FailureReason.NO_NUMBER),
+                ("50 shades of gray", unitconv.FailureReason.NO_UNITS),
+                ("1", unitconv.FailureReason.NO_NUMBER_INFO),
+                ("5 second", unitconv.FailureReason.NO_SUGGESTION),
+                ("5 km meters feet", unitconv.FailureReason.TOO_MANY_UNITS),
+                ("45°C in meters", unitconv.FailureReason.NO_MATCHING_UNITS),
+                ("1y in m", unitconv.FailureReason.NO_MATCHING_UNITS),
+            ])
+
+    def test_counters(self):
+        unitconv.failure_counts.clear()
+        unitconv.convert("2 meter in cm")
+        unitconv.convert("45°C in meters")
+        unitconv.convert("1y in m")
+        self.assertEqual(unitconv.failure_counts, {
+            None: 1,
+            unitconv.FailureReason.NO_MATCHING_UNITS: 2,
+        })
+
+    def test_no_debug_logging_if_disabled(self):
+        _l.setLevel(logging.INFO)
+        self.addCleanup(_l.setLevel, logging.DEBUG)
+        with patch.object(_l, 'debug') as mock_debug:
+            unitconv.convert("2 meter in cm")
+        mock_debug.assert_not_called()
+
+
+class ScanTestCase(TestCase):
+    """Check the document scanner."""
+
+    text = (
+        "Mix 250g of flour with 2 cups of milk, and bake it 20 minutes in the oven.\n"
+        "The box measures 3 ft ** 2 and weighs 5 lbs in kg; 50 shades of gray.\n"
+    )
+
+    def test_mentions(self):
+        mentions = list(unitconv.scan(self.text))
+        self.assertEqual([(m.source, m.result.text) for m in mentions], [
+            ("250g", "250 grams = 8.8185 ounces"),
+            ("2 cups", "2 US cups = 473.1765 millilitres"),
+            ("20 minutes", "20 minutes = 1200 seconds"),
+            ("3 ft ** 2", "3 square feet = 0.2787 square meters"),
+            ("5 lbs in kg", "5 pounds = 2.268 kilograms"),
+        ])
+        for m in mentions:
+            self.assertEqual(self.text[m.start:m.end], m.source)
+
+    def test_failed_conversion(self):
+        (mention,) = unitconv.scan("it took 5 seconds")
+        self.assertEqual(mention.source, "5 seconds")
+        self.assertEqual(mention.result.failure, unitconv.FailureReason.NO_SUGGESTION)
+
+    def test_nothing(self):
+        self.assertEqual(list(unitconv.scan("50 shades of gray")), [])
+
+    def test_file(self):
+        mentions = list(unitconv.scan(StringIO(self.text)))
+        self.assertEqual(mentions, list(unitconv.scan(self.text)))
+
+    def test_chunks_borders(self):
+        text = self.text * 50
+        expected = list(unitconv.scan(text))
+        self.assertEqual(len(expected), 250)
+        for chunk_size in (7, 64, 100, 1000):
+            self.assertEqual(list(unitconv.scan(text, chunk_size=chunk_size)), expected)
+
+    def test_connector_as_unit(self):
+        mentions = list(unitconv.scan("The shelf is 30 in wide, 5 m in cm"))
+        self.assertEqual([(m.source, m.result.text) for m in mentions], [
+            ("30 in", "30 inches = 76.2 centimeters"),
+            ("5 m in cm", "5 meters = 500 centimeters"),
+        ])
+
+    def test_thousands_separators(self):
+        text = "It ships 1,200 km, then 1,200,000 km with 1,234.5 kg, but 3,5 m"
+        mentions = list(unitconv.scan(text))
+        self.assertEqual([(m.source, m.result.text) for m in mentions], [
+            ("1,200 km", "1200 kilometers = 745.6454 miles"),
+            ("1,200,000 km", "1200000 kilometers = 745645.4307 miles"),
+            ("1,234.5 kg", "1234.5 kilograms = 2721.6066 pounds"),
+            ("3,5 m", "3.5 meters = 3.8276 yards"),
+        ])
+        for m in mentions:
+            self.assertEqual(text[m.start:m.end], m.source)
+
+    def test_buffer_bounded(self):
+        # a whitespace only at the beginning must not make the buffer grow forever
+        original = unitconv._find_mentions
+        sizes = []
+
+        def _find_mentions(manager, text, debug):
+            sizes.append(len(text))
+            return original(manager, text, debug)
+
+        text = "1 m " + "x" * 200000 + " 2 m\t" + "°" * 200000 + "\r3 km"
+        with patch.object(unitconv, '_find_mentions', _find_mentions):
+            mentions = list(unitconv.scan(text, chunk_size=1000))
+        self.assertLessEqual(max(sizes), 1000 + 2 * unitconv.SCAN_OVERLAP)
+        self.assertEqual([m.source for m in mentions], ["1 m", "2 m", "3 km"])
+        for m in mentions:
+            self.assertEqual(text[m.start:m.end], m.source)
+
+
+class LimitsTestCase(CheckingTestCase):
+    """Check the limits to the input."""
+
+    def test_input_too_long(self):
+        result = unitconv.convert_result("2 meter in cm" + " " * 1000)
+        self.assertEqual(result.failure, unitconv.FailureReason.INPUT_TOO_LONG)
+
+    def test_input_limit_disabled(self):
+        with patch.object(unitconv, 'MAX_INPUT_LENGTH', None):
+            self.check([
+                ("2 meter in cm" + " " * 1000, "2 meters = 200 centimeters"),
+            ])
+
+    def test_invalid_numbers(self):
+        for inp in ["1e999 meters", "1e99999999 m", "1" * 500 + " m", "1e400"]:
+            result = unitconv.convert_result(inp)
+            self.assertEqual(result.failure, unitconv.FailureReason.INVALID_NUMBER, inp)
+
+    def test_long_fractional_part(self):
+        self.check([
+            ("0." + "5" * 400 + " m in cm", "0.5555555555555556 meters = 55.5556 centimeters"),
+        ])
+
+
+class FuzzTestCase(TestCase):
+    """Fuzz the converter (see benchmark_linear_time.py for its timings)."""
+
+    def test_fuzz(self):
+        pieces = ['1', '2', '3', '0', '.', ',', 'e', '-', '+', ' ', '  ', '*', '**', '^',
+                  '²', '³', '°', 'm', 'sq', 'cubic', 'in', 'to', 'ft', 'x', '?', '\n']
+        rand = random.Random(42)
+        for _ in range(1000):
+            text = "".join(rand.choice(pieces) for _ in range(rand.randint(1, 30)))
+            try:
+                unitconv.convert_result(text)
+                list(unitconv.scan(text))
+            except Exception as err:
+                self.fail("Exploded with %r when %r" % (err, text))
+
+
+class DaemonTestCase(TestCase):
+    """Check the daemon and its client."""
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.socket_path = os.path.join(tmpdir.name, 'test.sock')
+
+    def start_daemon(self):
+        server = unitconv._get_server(self.socket_path)
+        thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': .01})
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(thread.join)
+        self.addCleanup(server.shutdown)
+
+    def test_query(self):
+        self.start_daemon()
+        response = unitconv.client.query_daemon("42 km to miles", self.socket_path)
+        self.assertEqual(response, "42 kilometers = 26.0976 miles")
+
+    def test_query_not_converted(self):
+        self.start_daemon()
+        response = unitconv.client.query_daemon("50 shades of gray", self.socket_path)
+        self.assertEqual(response, "None")
+
+    def test_socket_only_for_the_user(self):
+        self.start_daemon()
+        self.assertEqual(os.stat(self.socket_path).st_mode & 0o077, 0)
+
+    def test_no_daemon(self):
+        response = unitconv.client.query_daemon("42 km to miles", self.socket_path)
+        self.assertIsNone(response)
+
+    def test_stale_socket(self):
+        with open(self.socket_path, 'w'):
+            pass
+        self.start_daemon()
+        response = unitconv.client.query_daemon("2 meter in cm", self.socket_path)
+        self.assertEqual(response, "2 meters = 200 centimeters")
+
+    def test_socket_not_private(self):
+        self.start_daemon()
+        os.chmod(os.path.dirname(self.socket_path), 0o755)
+        self.addCleanup(os.chmod, os.path.dirname(self.socket_path), 0o700)
+        self.assertIsNone(unitconv.client.query_daemon("2 meter in cm", self.socket_path))
+
+    def test_directory_not_private(self):
+        socket_dir = os.path.dirname(self.socket_path)
+        os.chmod(socket_dir, 0o777)
+        self.addCleanup(os.chmod, socket_dir, 0o700)
+        with self.assertRaises(RuntimeError):
+            unitconv._get_server(self.socket_path)
+
+    def test_directory_created(self):
+        socket_path = os.path.join(os.path.dirname(self.socket_path), 'sub', 'test.sock')
+        server = unitconv._get_server(socket_path)
+        self.addCleanup(server.server_close)
+        self.assertEqual(os.stat(os.path.dirname(socket_path)).st_mode & 0o777, 0o700)
+
+    def test_default_socket_path(self):
+        with patch.dict(os.environ, {'XDG_RUNTIME_DIR': ''}):
+            path = unitconv.client.get_socket_path()
+        self.assertEqual(os.path.basename(os.path.dirname(path)), 'unitconv-{}'.format(os.getuid()))
+
+    def test_socket_per_version(self):
+        path = unitconv.client.get_socket_path()
+        self.assertTrue(path.endswith('-{}.sock'.format(unitconv.client.results_fingerprint())))
+        with patch.object(unitconv.client, 'results_fingerprint', return_value='0123456789abcdef'):
+            self.assertNotEqual(unitconv.client.get_socket_path(), path)
+
+    def test_fingerprint_same_for_script(self):
+        self.assertEqual(unitconv_cli.client.results_fingerprint(),
+                         unitconv.client.results_fingerprint())
+        self.assertEqual(unitconv._results_fingerprint(), unitconv.client.results_fingerprint())
+
+    def test_client_light(self):
+        # the script talks to the daemon without importing the package (nor pint)
+        code = "import sys, unitconv_cli; print('pint' in sys.modules, 'unitconv' in sys.modules)"
+        output = subprocess.check_output([sys.executable, '-c', code], universal_newlines=True)
+        self.assertEqual(output, "False False\n")
+
+    def test_already_running(self):
+        self.start_daemon()
+        with self.assertRaises(RuntimeError):
+            unitconv._get_server(self.socket_path)
+
+    def test_client_forwards(self):
+        with patch.object(unitconv_cli.client, 'query_daemon', return_value="forwarded"):
+            with patch.object(sys, 'argv', ['unitconv', '42', 'km', 'to', 'miles']):
+                with patch('builtins.print') as mock_print:
+                    unitconv_cli.main()
+        mock_print.assert_called_once_with("forwarded")
+
+    def test_client_fallback(self):
+        with patch.object(unitconv_cli.client, 'query_daemon', return_value=None):
+            with patch.object(sys, 'argv', ['unitconv', '42', 'km', 'to', 'miles']):
+                with patch('builtins.print') as mock_print:
+                    unitconv_cli.main()
+        mock_print.assert_called_once_with("42 kilometers = 26.0976 miles")
+
+
+class ConvertValueTestCase(TestCase):
+    """Check the conversion without parsing."""
+
+    def test_names(self):
+        self.assertEqual(unitconv.convert_value(42, 'km', 'miles'), "42 kilometers = 26.0976 miles")
+        self.assertEqual(unitconv.convert_value(42, 'kilometer', 'mile'),
+                         "42 kilometers = 26.0976 miles")
+        self.assertEqual(unitconv.convert_value(2.5, 'square_meter', 'sq ft'),
+                         "2.5 square meters = 26.9098 square feet")
+        self.assertEqual(unitconv.convert_value(20, '°C', 'F'), "20°C = 68°F")
+
+    def test_same_as_convert(self):
+        self.assertEqual(unitconv.convert_value(3, 'lb', 'mg'), unitconv.convert("3lb in mg"))
+        self.assertEqual(unitconv.convert_value(1, 'y', 'weeks'), unitconv.convert("1y in weeks"))
+
+    def test_superscripts(self):
+        expected = "3 square meters = 32.2917 square feet"
+        for from_unit, to_unit in [('m²', 'ft²'), ('m2', 'ft2'), ('m^2', 'ft ** 2')]:
+            self.assertEqual(unitconv.convert_value(3, from_unit, to_unit), expected)
+        self.assertEqual(unitconv.convert_value(2, 'cm³', 'in3'),
+                         "2 cubic centimeters = 0.122 cubic inches")
+
+    def test_number_types(self):
+        expected = "2.5 kilometers = 1.5534 miles"
+        self.assertEqual(unitconv.convert_value('2.5', 'km', 'mi'), expected)
+        self.assertEqual(unitconv.convert_value(decimal.Decimal('2.5'), 'km', 'mi'), expected)
+        self.assertEqual(unitconv.convert_value(fractions.Fraction(5, 2), 'km', 'mi'), expected)
+
+    def test_invalid_number(self):
+        nonfinite = [float('inf'), float('-inf'), float('nan'), 'inf', decimal.Decimal('NaN')]
+        for number in ['abc', None] + nonfinite:
+            for exact in (False, True):
+                with self.assertRaises(ValueError) as cm:
+                    unitconv.convert_value(number, 'km', 'mi', exact=exact)
+                self.assertEqual(str(cm.exception), "Invalid number: {!r}".format(number))
+
+    def test_collision_resolved(self):
+        self.assertEqual(unitconv.convert_value(1, 'liter', 'ounces'),
+                         "1 litre = 33.814 US fluid ounces")
+
+    def test_ambiguous(self):
+        with self.assertRaises(ValueError) as cm:
+            unitconv.convert_value(1, 'y', 'm')
+        self.assertEqual(
+            str(cm.exception), "Ambiguous units: 'y' and 'm' (could be yard to meter, year to month)")
+
+    def test_incompatible(self):
+        with self.assertRaises(ValueError) as cm:
+            unitconv.convert_value(1, 'km', 'kg')
+        self.assertEqual(str(cm.exception), "Incompatible units: 'km' and 'kg'")
+
+    def test_unknown(self):
+        with self.assertRaises(ValueError) as cm:
+            unitconv.convert_value(1, 'km', 'parsec')
+        self.assertEqual(str(cm.exception), "Unknown unit: 'parsec'")
+
+
+class LocalesTestCase(CheckingTestCase):
+    """Check the vocabularies for other languages."""
+
+    def test_structures_consistency(self):
+        for module_info in pkgutil.iter_modules(unitconv.locales.__path__):
+            pack = importlib.import_module('unitconv.locales.' + module_info.name)
+
+            extra_units = set(v for k, v in pack.EXTRA_UNITS_INPUT)
+            miss = extra_units - set(unitconv.SUPPORTED_UNITS)
+            self.assertFalse(miss, (module_info.name, miss))
+
+            miss = set(pack.UNITS_OUTPUT) ^ set(unitconv.SUPPORTED_UNITS)
+            self.assertFalse(miss, (module_info.name, miss))
+
+    def test_spanish(self):
+        operations = [
+            ("3 metros a pies", "3 metros = 9.8425 pies"),
+            ("10 metros cuadrados en pies cuadrados",
+             "10 metros cuadrados = 107.6391 pies cuadrados"),
+            ("1 kilo en libras", "1 kilogramo = 2.2046 libras"),
+            ("20 km", "20 kilómetros = 12.4274 millas"),
+            ("45°C", "45°C = 113°F"),
+            ("100", None),
+        ]
+        for inp, result in operations:
+            self.assertEqual(unitconv.convert(inp, locale='es'), result, inp)
+        self.assertEqual(unitconv.convert_value(3, 'pies', 'metros', locale='es'),
+                         "3 pies = 0.9144 metros")
+
+    def test_spanish_without_accents(self):
+        operations = [
+            ("3 kilometros a millas", "3 kilómetros = 1.8641 millas"),
+            ("5 pulgadas en centimetros", "5 pulgadas = 12.7 centímetros"),
+            ("3 metros cubicos a litros", "3 metros cúbicos = 3000 litros"),
+            ("2 cuartos de galon a litros", "2 cuartos de galón = 1.8927 litros"),
+            ("3 KILOMETROS a millas", "3 kilómetros = 1.8641 millas"),
+        ]
+        for inp, result in operations:
+            self.assertEqual(unitconv.convert(inp, locale='es'), result, inp)
+
+    def test_strip_accents(self):
+        self.assertEqual(unitconv._strip_accents("cúbicos días galón"), "cubicos dias galon")
+        self.assertEqual(unitconv._strip_accents("°c"), "°c")
+
+    def test_default_untouched(self):
+        self.check([
+            ("3 metros a pies", None),
+            ("3 meters to feet", "3 meters = 9.8425 feet"),
+        ])
+        self.assertEqual(unitconv.convert("3 meters to feet", locale='en'),
+                         "3 meters = 9.8425 feet")
+
+    def test_loaded_lazily_once(self):
+        with patch.dict(unitconv._locale_managers, clear=True):
+            self.assertNotIn('es', unitconv._locale_managers)
+            manager = unitconv.get_unit_manager('es')
+            self.assertIs(unitconv._locale_managers['es'], manager)
+            self.assertIs(unitconv.get_unit_manager('es'), manager)
+
+    def test_unknown_locale(self):
+        with self.assertRaises(ValueError):
+            unitconv.convert("3 meters to feet", locale='xx')
+        with self.assertRaises(ValueError):
+            unitconv.convert("3 meters to feet", locale='../es')
+
+
+class ExactModeTestCase(CheckingTestCase):
+    """Check the conversions done with rationals."""
+
+    def test_conversions(self):
+        operations = [
+            ("0.1 are in square meters", "0.1 ares = 10 square meters"),
+            ("1.23455e6 inches in feet", "1234550 inches = 102879.1667 feet"),
+            ("20F in C", "20°F = -6.6667°C"),
+            ("3lb in mg", "3 pounds = 1360777.11 milligrams"),
+            ("12.34 inches in feet", "12.34 inches = 1.0283 feet"),
+            (",7 meter in feet", "0.7 meters = 2.2966 feet"),
+            ("1e-3 km in m", "0.001 kilometers = 1 meter"),
+            ("100 hectare", "100 hectares = 0.3861 square miles"),
+            ("0.1234567890123456789 km in m", "0.1234567890123456789 kilometers = 123.4568 meters"),
+        ]
+        for inp, result in operations:
+            self.assertEqual(unitconv.convert(inp, exact=True), result, inp)
+
+    def test_parse_number(self):
+        tokens = unitconv.get_unit_manager().tokenize("1.10 2e-2 3", exact=True)
+        self.assertEqual([t.value for t in tokens], [
+            fractions.Fraction(11, 10), fractions.Fraction(1, 50), 3])
+
+    def test_convert_value(self):
+        self.assertEqual(unitconv.convert_value('0.1', 'are', 'sq m', exact=True),
+                         "0.1 ares = 10 square meters")
+        self.assertEqual(unitconv.convert_value(fractions.Fraction(1, 3), 'ft', 'in', exact=True),
+                         "1/3 feet = 4 inches")
+
+    def test_factors_match_float_path(self):
+        for name_from, name_to in itertools.product(unitconv.SUPPORTED_UNITS, repeat=2):
+            _, unit_from = unitconv.SUPPORTED_UNITS[name_from]
+            _, unit_to = unitconv.SUPPORTED_UNITS[name_to]
+            if unit_from.dimensionality != unit_to.dimensionality:
+                continue
+            factor = unitconv._conversion_factor(name_from, name_to)
+            scale, offset = unitconv._exact_conversion(name_from, name_to)
+            if factor is None:
+                self.assertNotEqual(offset, 0, (name_from, name_to))
+            else:
+                self.assertEqual(offset, 0, (name_from, name_to))
+                self.assertAlmostEqual(float(scale) / factor, 1, places=12, msg=(name_from, name_to))
+
+
+class SharedCacheTestCase(TestCase):
+    """Check the results cache shared between processes."""
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.path = os.path.join(tmpdir.name, 'test.cache')
+        unitconv.enable_shared_cache(self.path, entries=64)
+        self.addCleanup(unitconv.disable_shared_cache)
+
+    def other_process_cache(self):
+        """Map the same file, as another process would."""
+        cache = unitconv._SharedCache(self.path, 64)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_shared(self):
+        self.assertEqual(unitconv.convert("2 meter in cm"), "2 meters = 200 centimeters")
+        cached = self.other_process_cache().get("en:0:2 meter in cm")
+        self.assertEqual(cached, unitconv.Result("2 meters = 200 centimeters", None))
+
+    def test_hit(self):
+        self.other_process_cache().put("en:0:2 meter in cm", unitconv.Result("fake", None))
+        self.assertEqual(unitconv.convert("2 meter in cm"), "fake")
+
+    def test_failures(self):
+        result = unitconv.convert_result("45°C in meters")
+        cached = self.other_process_cache().get("en:0:45°C in meters")
+        self.assertEqual(cached, result)
+        self.assertEqual(cached.failure, unitconv.FailureReason.NO_MATCHING_UNITS)
+
+    def test_locale_and_exact_in_key(self):
+        unitconv.convert("3 m a cm", locale='es', exact=True)
+        cache = self.other_process_cache()
+        self.assertIsNone(cache.get("en:0:3 m a cm"))
+        self.assertEqual(cache.get("es:1:3 m a cm"),
+                         unitconv.Result("3 metros = 300 centímetros", None))
+
+    def test_numbers_info_not_cached(self):
+        data = [
+            (100, 'meters', 'size', 'a monster'),
+        ]
+        with patch.object(unitconv, 'NUMBERS_INFO', data):
+            result = unitconv.convert_result("100")
+        self.assertFalse(result.deterministic)
+        self.assertIsNone(self.other_process_cache().get("en:0:100"))
+
+    def test_numbers_info_seeded_cached(self):
+        data = [
+            (100, 'meters', 'size', 'a monster'),
+        ]
+        with patch.object(unitconv, 'NUMBERS_INFO', data):
+            result = unitconv.convert_result("100", seed=3)
+        self.assertTrue(result.deterministic)
+        cache = self.other_process_cache()
+        self.assertEqual(cache.get("en:0/3:100"), result)
+        self.assertIsNone(cache.get("en:0:100"))
+
+    def test_not_private(self):
+        path = self.path + '.other'
+        with open(path, 'wb') as fh:
+            fh.write(b'\0' * 65 * unitconv.SHARED_CACHE_ENTRY_SIZE)
+        os.chmod(path, 0o644)
+        with self.assertRaises(ValueError):
+            unitconv._SharedCache(path, 64)
+
+    def test_symlink(self):
+        path = self.path + '.link'
+        os.symlink(self.path, path)
+        with self.assertRaises(OSError):
+            unitconv._SharedCache(path, 64)
+
+    def test_other_version(self):
+        self.other_process_cache().put("en:0:2 meter in cm", unitconv.Result("old", None))
+        unitconv.disable_shared_cache()
+        with patch.object(unitconv, '_results_fingerprint', return_value='0123456789abcdef'):
+            with self.assertRaises(ValueError):
+                unitconv._SharedCache(self.path, 64)
+
+    def test_default_path_per_version(self):
+        with patch.object(unitconv, '_SharedCache') as mock_cache:
+            unitconv.enable_shared_cache()
+        (path, _), _ = mock_cache.call_args
+        self.assertTrue(path.endswith('-{}.cache'.format(unitconv._results_fingerprint())), path)
+
+    def test_seed_not_in_key_if_irrelevant(self):
+        for seed in range(3):
+            unitconv.convert("2 meter in cm", seed=seed)
+        cache = self.other_process_cache()
+        self.assertEqual(cache.get("en:0:2 meter in cm"),
+                         unitconv.Result("2 meters = 200 centimeters", None))
+        self.assertIsNone(cache.get("en:0/1:2 meter in cm"))
+
+    def test_numbers_info_seeded_text_key(self):
+        data = [
+            (100, 'meters', 'size', 'a monster'),
+        ]
+        with patch.object(unitconv, 'NUMBERS_INFO', data):
+            result = unitconv.convert_result("100", seed="3")
+        cache = self.other_process_cache()
+        self.assertEqual(cache.get("en:0/'3':100"), result)
+        self.assertIsNone(cache.get("en:0/3:100"))
+
+    def test_numbers_info_seeded_hit(self):
+        self.other_process_cache().put("en:0/3:100", unitconv.Result("fake", None))
+        self.assertEqual(unitconv.convert("100", seed=3), "fake")
+
+    def test_too_big(self):
+        cache = self.other_process_cache()
+        cache.put("long query", unitconv.Result("x" * 300, None))
+        self.assertIsNone(cache.get("long query"))
+
+    def test_bounded_with_eviction(self):
+        cache = self.other_process_cache()
+        for i in range(1000):
+            cache.put("query {}".format(i), unitconv.Result(str(i), None))
+        self.assertEqual(os.stat(self.path).st_size, 65 * unitconv.SHARED_CACHE_ENTRY_SIZE)
+        self.assertEqual(cache.get("query 999"), unitconv.Result("999", None))
+        found = sum(cache.get("query {}".format(i)) is not None for i in range(1000))
+        self.assertLessEqual(found, 64)
+
+    def test_corrupted_entry_ignored(self):
+        cache = self.other_process_cache()
+        cache.put("some query", unitconv.Result("some result", None))
+        for pos in range(0, 64 * unitconv.SHARED_CACHE_ENTRY_SIZE, unitconv.SHARED_CACHE_ENTRY_SIZE):
+            if cache._mmap[pos + 12] != 0:
+                # the kind of value is not empty, that's the entry; break its text
+                cache._mmap[pos + 30] ^= 0xFF
+        self.assertIsNone(cache.get("some query"))
+
+    def test_different_size(self):
+        with self.assertRaises(ValueError):
+            unitconv._SharedCache(self.path, 128)
+
+
+class SuggestionScaleTestCase(CheckingTestCase):
+    """Check that the suggested unit suits the magnitude of the value."""
+
+    def test_scaled(self):
+        self.check([
+            ("45mg", "45 milligrams = 0.6945 grains"),
+            ("3000000 centimeter", "3000000 centimeters = 18.6411 miles"),
+            ("20000 kg", "20000 kilograms = 22.0462 short tons"),
+            ("0.1 cc", "0.1 cubic centimeters = 0.0203 US teaspoons"),
+            ("1 hectare", "1 hectare = 2.471 acres"),
+            ("3 grains", "3 grains = 194.3967 milligrams"),
+        ])
+
+    def test_default_kept(self):
+        self.check([
+            ("cm 20", "20 centimeters = 7.874 inches"),
+            ("100 hectare", "100 hectares = 0.3861 square miles"),
+            ("3 ft ** 2", "3 square feet = 0.2787 square meters"),
+            ("1 km", "1 kilometer = 0.6214 miles"),
+            ("2 cups", "2 US cups = 473.1765 millilitres"),
+            ("1000 m", "1000 meters = 1093.6133 yards"),
+        ])
+
+    def test_boundaries(self):
+        self.check([
+            ("40 cups", "40 US cups = 9463.5295 millilitres"),
+            ("50 cups", "50 US cups = 11.8294 litres"),
+            ("9000 m", "9000 meters = 9842.5197 yards"),
+            ("9200 m", "9200 meters = 5.7166 miles"),
+            ("0.1 m", "0.1 meters = 0.1094 yards"),
+            ("0.09 m", "0.09 meters = 3.5433 inches"),
+        ])
+
+    def test_zero(self):
+        self.check([
+            ("0 m", "0 meters = 0 inches"),
+        ])
+
+    def test_not_in_ladder(self):
+        self.check([
+            ("5h", "5 hours = 18000 seconds"),
+            ("20 °C", "20°C = 68°F"),
+        ])
+
+    def test_in_scan(self):
+        mentions = unitconv.scan("it weighs 45mg and is 3000000 cm far")
+        self.assertEqual([m.result.text for m in mentions], [
+            "45 milligrams = 0.6945 grains",
+            "3000000 centimeters = 18.6411 miles",
+        ])
+
+
+class ProfileTestCase(TestCase):
+    """Check the replay of query logs under the profiler."""
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.log_path = os.path.join(tmpdir.name, 'queries.log')
+        with open(self.log_path, 'w', encoding='utf8') as fh:
+            fh.write("42 km to miles\n3.5 km to miles\n\n45mg\n100\n50 shades of gray\n")
+        self.output_path = os.path.join(tmpdir.name, 'profile.json')
+
+    def test_functions(self):
+        report = unitconv.profile_log(self.log_path)
+        self.assertEqual(report['queries'], 5)
+        functions = {item['name']: item for item in report['functions']}
+        self.assertEqual(functions['convert']['calls'], 5)
+        self.assertEqual(functions['parse_number']['calls'], 5)
+        self.assertEqual(functions['_numbers_info']['calls'], 1)
+        self.assertIn('_UnitManager.get_units_info', functions)
+        self.assertIn('_UnitManager.suggest', functions)
+        self.assertIn('pint', functions)
+        cumulative = [item['cumulative_time'] for item in report['functions']]
+        self.assertEqual(cumulative, sorted(cumulative, reverse=True))
+
+    def test_templates(self):
+        report = unitconv.profile_log(self.log_path)
+        templates = {item['template']: item['queries'] for item in report['templates']}
+        self.assertEqual(templates, {
+            "# km to miles": 2, "#mg": 1, "#": 1, "# shades of gray": 1})
+
+    def test_output(self):
+        report = unitconv.profile_log(self.log_path, self.output_path)
+        with open(self.output_path, encoding='utf8') as fh:
+            self.assertEqual(json.load(fh), report)
+
+    def test_main(self):
+        with patch.object(sys, 'argv', ['unitconv', 'profile', self.log_path, self.output_path]):
+            with patch('builtins.print') as mock_print:
+                unitconv.main()
+        printed = mock_print.call_args_list[0][0][0]
+        self.assertTrue(printed.startswith("Replayed 5 queries in "), printed)
+        self.assertIn("# km to miles", printed)
+        self.assertTrue(os.path.exists(self.output_path))
+
+    def test_client_not_forwarded(self):
+        with patch.object(unitconv_cli.client, 'query_daemon') as mock_query:
+            with patch.object(sys, 'argv', ['unitconv', 'profile', self.log_path, self.output_path]):
+                with patch('builtins.print'):
+                    unitconv_cli.main()
+        mock_query.assert_not_called()
@@ -4,23 +4,78 @@
 
 """A units converter."""
 
+import bisect
 import collections
+import cProfile
+import enum
+import fractions
+import functools
+import hashlib
+import importlib
+import io
 import itertools
+import json
 import logging
 import math
+import mmap
+import os
+import pstats
+import queue
 import random
 import re
+import signal
+import socketserver
+import struct
 import sys
+import tempfile
+import threading
+import time
+import unicodedata
+import zlib
 
 import pint
 
-__all__ = ['convert']
+from unitconv import client
+
+__all__ = [
+    'FailureReason', 'convert', 'convert_result', 'convert_value', 'disable_shared_cache',
+    'enable_shared_cache', 'profile_log', 'scan', 'tokenize']
 
 logger = logging.getLogger(__name__)
 
 _ureg = pint.UnitRegistry()
 
-UnitInfo = collections.namedtuple("UnitInfo", "mult unit human_single human_plural")
+UnitInfo = collections.namedtuple("UnitInfo", "name mult unit human_single human_plural")
+
+# a piece of the user input: its kind ('number', 'unit', 'connector' or
+# 'superscript'), the useful value, and its span in the source text
+Token = collections.namedtuple("Token", "kind value start end")
+
+# the outcome of a conversion: the human text, or why it failed; and if the
+# same query would always give the same outcome
+Result = collections.namedtuple("Result", "text failure deterministic", defaults=(True,))
+
+
+class FailureReason(enum.Enum):
+    """The reasons for a query to not be converted."""
+
+    INPUT_TOO_LONG = 'input_too_long'        # the query exceeds MAX_INPUT_LENGTH
+    NO_NUMBER = 'no_number'                  # there is no number in the query
+    INVALID_NUMBER = 'invalid_number'        # the number is too big or too small
+    NO_UNITS = 'no_units'                    # the number is not alone, but no units found
+    NO_NUMBER_INFO = 'no_number_info'        # the number is alone, but no info about it
+    NO_SUGGESTION = 'no_suggestion'          # only one unit, and nothing to suggest
+    TOO_MANY_UNITS = 'too_many_units'        # more than two units after removing connectors
+    NO_MATCHING_UNITS = 'no_matching_units'  # the units are incompatible or ambiguous
+    DIMENSIONALITY = 'dimensionality'        # pint refused the conversion
+
+
+# a quantity found when scanning a text: its span in the whole text, that
+# piece of text, and the conversion Result
+Mention = collections.namedtuple("Mention", "start end source result")
+
+# how many times each conversion failed, by reason (None counts the successful ones)
+failure_counts = collections.Counter()
 
 # crazy regex to match a number; this comes from the Python's Decimal code,
 # adapted to support also commas
@@ -31,10 +86,30 @@ RE_NUMBER = r"""               # A numeric string consists of:
     ((e|E)(?P<exp>[-+]?\d+))?  # followed by an optional exponent, or...
 """
 
+# a number with thousands separators, like '1,200' or '12,345,678.9'; in an
+# English text this is grouping and not a decimal comma (only used to scan texts)
+RE_GROUPED_NUMBER = re.compile(r"(?<![\w.,])\d{1,3}(?:,\d{3})+(?:\.\d+)?(?!\d|[.,]\d)")
+
+# the lexer: all the alternatives are tried at each position of the text, in
+# order, and the input is walked only once
+RE_LEXER = re.compile(r"""
+    (?P<superscript>
+        (?<!\ )\ *(?:\*\*|\^)\ *[23]   # 'm ** 2', 'cm^3', etc, or...
+        |(?<=[a-z])[23]            # a number right after a letter, or...
+        |[²³]                      # the unicode chars
+    )
+    |(?P<number>""" + RE_NUMBER + r""")
+    |(?P<word>°?[^\W\d²³]+)       # anything else that may be a unit or connector
+""", re.VERBOSE | re.IGNORECASE)
+
+# the next word of a multi-word unit, after a single space
+RE_NEXT_WORD = re.compile(r" ([^\W\d²³]+)(?!\w)")
+
 
 # supported units by the system; the key is the reference name, its
 # multiplier (if any) and the pint unit
 SUPPORTED_UNITS = {
+    'acre': (None, _ureg.acre),
     'are': (None, _ureg.are),
     'celsius': (None, _ureg.degC),
     'centimeter': (None, _ureg.centimeter),
@@ -51,6 +126,7 @@ SUPPORTED_UNITS = {
     'fluid_ounce': (None, _ureg.floz),
     'foot': (None, _ureg.feet),
     'gallon': (None, _ureg.gallon),
+    'grain': (None, _ureg.grain),
     'gram': (None, _ureg.grams),
     'hectare': (100, _ureg.are),
     'hour': (None, _ureg.hour),
@@ -122,6 +198,7 @@ UNIT_SYMBOLS = [
 # synonyms, abbreviations, and other names for same unit; and also
 # multi-word conversions
 EXTRA_UNITS_INPUT = [
+    ('acres', 'acre'),
     ('ares', 'are'),
     ('centimeters', 'centimeter'),
     ('cubic centimeter', 'cubic_centimeter'),
@@ -154,6 +231,7 @@ EXTRA_UNITS_INPUT = [
     ('fluid ounces', 'fluid_ounce'),
     ('gal', 'gallon'),
     ('gallons', 'gallon'),
+    ('grains', 'grain'),
     ('grams', 'gram'),
     ('hectares', 'hectare'),
     ('hours', 'hour'),
@@ -249,6 +327,7 @@ EXTRA_UNITS_INPUT = [
 
 # human unit representation for outputs to the user
 UNITS_OUTPUT = {
+    'acre': ('{} acre', '{} acres'),
     'are': ('{} are', '{} ares'),
     'celsius': ('{}°C', '{}°C'),
     'centimeter': ('{} centimeter', '{} centimeters'),
@@ -265,6 +344,7 @@ UNITS_OUTPUT = {
     'fluid_ounce': ('{} US fluid ounce', '{} US fluid ounces'),
     'foot': ('{} foot', '{} feet'),
     'gallon': ('{} US gallon', '{} US gallons'),
+    'grain': ('{} grain', '{} grains'),
     'gram': ('{} gram', '{} grams'),
     'hectare': ('{} hectare', '{} hectares'),
     'hour': ('{} hour', '{} hours'),
@@ -300,6 +380,9 @@ UNITS_OUTPUT = {
     'year': ('{} year', '{} years'),
 }
 
+# the language of the vocabulary here; others are in `unitconv.locales`
+DEFAULT_LOCALE = 'en'
+
 # normal connectors in user input
 CONNECTORS = [
     'to',
@@ -326,12 +409,47 @@ NUMBERS_INFO = [
 # too repeated), but will select randomly between the top N:
 NUMBERS_UNCERTAINTY = 3
 
+# the longest request the daemon reads, in bytes
+DAEMON_MAX_REQUEST = 65536
+
+# the longest query to be converted, in characters (None for no limit); the
+# conversion time grows linearly with the input, but there is no point in
+# accepting big inputs
+MAX_INPUT_LENGTH = 1000
+
+# the limits of numbers in the queries, more than what a float can hold
+MAX_NUMBER_DIGITS = 309
+MAX_EXPONENT_DIGITS = 3
+
+# when scanning documents, how much is read at once, and how much of each chunk
+# is kept to be processed again with the next one (so quantities split by the
+# chunks border are not lost)
+SCAN_CHUNK_SIZE = 65536
+SCAN_OVERLAP = 64
+
+# the size of each entry in the results cache shared between processes (if
+# the query and result don't fit, it's not cached), how many entries, and in
+# how many consecutive entries to look for a query before evicting one
+SHARED_CACHE_ENTRY_SIZE = 256
+SHARED_CACHE_ENTRIES = 65536
+SHARED_CACHE_PROBES = 4
+
+# fraction of the conversions done through the fast path that are also done
+# through pint in background, to verify that both give the same result (0
+# disables this shadow verification); divergences are logged and stored in
+# `shadow_divergences`
+SHADOW_SAMPLE_RATE = 0
+
+# how many functions and query templates are shown in the profile report
+PROFILE_TOP = 15
+
 # table to suggest a second unit; general rules are:
 #  - if it's temperature, just go celsius<->fahrenheit
 #  - if it's time, go to a lower unit, but not immediate one (which is
 #    so easy that user shouldn't need it the unit conversor)
 #  - for the rest, just go imperial<->metric, using a similar size unit
 SUGGESTED_SECOND_UNIT = {
+    'acre': 'hectare',
     'are': 'square_yard',
     'celsius': 'fahrenheit',
     'centimeter': 'inch',
@@ -348,6 +466,7 @@ SUGGESTED_SECOND_UNIT = {
     'fluid_ounce': 'millilitre',
     'foot': 'meter',
     'gallon': 'litre',
+    'grain': 'milligram',
     'gram': 'ounce',
     'hectare': 'square_mile',
     'hour': 'second',
@@ -356,13 +475,16 @@ SUGGESTED_SECOND_UNIT = {
     'kilometer': 'mile',
     'litre': 'gallon',
     'meter': 'yard',
+    'metric_ton': 'short_ton',
     'mile': 'kilometer',
+    'milligram': 'ounce',
     'minute': 'second',
     'month': 'day',
     'ounce': 'gram',
     'pint': 'litre',
     'pound': 'kilogram',
     'quart': 'litre',
+    'short_ton': 'metric_ton',
     'square_centimeter': 'square_inch',
     'square_foot': 'square_meter',
     'square_inch': 'square_centimeter',
@@ -377,15 +499,50 @@ SUGGESTED_SECOND_UNIT = {
     'year': 'day',
 }
 
+# units of the same dimension and system, from the smallest to the biggest; when
+# the suggested second unit is in one of these and the value in it is out of
+# SUGGESTION_KEPT_RANGE, the unit of its ladder where the value is closest to
+# SUGGESTION_BEST_RANGE (in orders of magnitude) is used instead (so 3000000
+# centimeters are not expressed in inches, but in miles)
+SUGGESTION_LADDERS = [
+    ['centimeter', 'meter', 'kilometer'],
+    ['inch', 'foot', 'yard', 'mile'],
+    ['milligram', 'gram', 'kilogram', 'metric_ton'],
+    ['grain', 'ounce', 'pound', 'short_ton'],
+    ['millilitre', 'litre'],
+    ['teaspoon', 'tablespoon', 'fluid_ounce', 'cup', 'pint', 'quart', 'gallon'],
+    ['cubic_centimeter', 'cubic_meter', 'cubic_kilometer'],
+    ['cubic_inch', 'cubic_foot', 'cubic_yard', 'cubic_mile'],
+    ['square_centimeter', 'square_meter', 'hectare', 'square_kilometer'],
+    ['square_inch', 'square_foot', 'square_yard', 'acre', 'square_mile'],
+]
+SUGGESTION_KEPT_RANGE = (.1, 10000)
+SUGGESTION_BEST_RANGE = (1, 1000)
+
+
+def _strip_accents(text):
+    """Return the text without accents (or any other combining mark)."""
+    decomposed = unicodedata.normalize('NFD', text)
+    return unicodedata.normalize(
+        'NFC', "".join(char for char in decomposed if not unicodedata.combining(char)))
+
 
 class _UnitManager(object):
-    """A unique class to hold all units mambo jambo."""
+    """A unique class to hold all units mambo jambo, for a language."""
+
+    def __init__(self, extra_units_input, connectors, units_output):
+        # many people write without accents, so the names are also accepted that way
+        names = {name for name, _ in extra_units_input}
+        extra_units_input = list(extra_units_input) + [
+            (_strip_accents(name), syn) for name, syn in extra_units_input
+            if _strip_accents(name) not in names]
+        connectors = list(connectors) + [
+            _strip_accents(name) for name in connectors if _strip_accents(name) not in connectors]
 
-    def __init__(self):
         # generate the main unit conversion structure
         self._units = _u = {k: [k] for k in SUPPORTED_UNITS}
 
-        for name, syn in EXTRA_UNITS_INPUT:
+        for name, syn in extra_units_input:
             _u.setdefault(name, []).append(syn)
 
         for symbol, unit, linear in UNIT_SYMBOLS:
@@ -394,51 +551,413 @@ class _UnitManager(object):
                 _u[symbol + 'SUPERSCRIPT_TWO'] = _u['square_' + unit]
                 _u[symbol + 'SUPERSCRIPT_THREE'] = _u['cubic_' + unit]
 
-        # generate the useful tokens
-        _all_tokens = set(itertools.chain(_u.keys(), CONNECTORS))
-        self.useful_tokens = sorted(_all_tokens, key=len, reverse=True)
+        # a trie of the complex units, word by word; the unit is under the empty key
+        self._complex_trie = {}
+        for name, syn in extra_units_input:
+            if ' ' in name:
+                node = self._complex_trie
+                for word in name.split(' '):
+                    node = node.setdefault(word, {})
+                node[''] = syn
 
-        # generate the complex units conversion
-        _c = ((k, v) for k, v in EXTRA_UNITS_INPUT if ' ' in k)
-        self.complex_units = sorted(_c, key=lambda x: len(x[0]), reverse=True)
+        # the connectors, and how to show the units
+        self.connectors = connectors
+        self._units_output = units_output
 
-        # the connectors
-        self.connectors = CONNECTORS
+    def _complex_unit(self, text, word, pos):
+        """Return the multi-word unit starting with the word, and where it ends in the text.
 
-    def get_units_info(self, unit_token_from, unit_token_to):
-        """Return the info for the unit."""
-        base_units_from = self._units[unit_token_from]
-        base_units_to = self._units[unit_token_to]
+        The following words are walked in the trie, keeping the longest unit
+        found; None is returned if there's no unit.
+        """
+        found = None
+        node = self._complex_trie.get(word)
+        while node:
+            m = RE_NEXT_WORD.match(text, pos)
+            node = m and node.get(m.group(1).lower())
+            if node:
+                pos = m.end()
+                if '' in node:
+                    found = (node[''], pos)
+        return found
+
+    def _word_token(self, word, start, end):
+        """Return the token for a word, None if it's not useful."""
+        if word in self.connectors:
+            return Token('connector', word, start, end)
+        if word in self._units:
+            return Token('unit', word, start, end)
+
+    def tokenize(self, text, exact=False):
+        """Yield the useful tokens found in the text, walking it only once.
+
+        Superscripts glued to a unit are merged into it; other words that are
+        not units nor connectors are ignored. Numbers are parsed as floats, or
+        as ints and Fractions if exact.
+
+        The worst case time is linear in the length of the text: every lexer
+        alternative consumes its match without backtracking, the spaces
+        before a superscript are only tried from the start of each run, and
+        multi-word units are found walking the next few words in a trie.
+        """
+        # a word is held until we know if a superscript is glued to it
+        held = None
+        pos = 0
+        while True:
+            m = RE_LEXER.search(text, pos)
+            if m is None:
+                break
+            kind = m.lastgroup
+            start, end = m.span()
+            if kind == 'word':
+                complex_unit = self._complex_unit(text, m.group().lower(), end)
+                if complex_unit is not None:
+                    kind = 'complex'
+                    value, end = complex_unit
+            pos = end
+
+            if kind == 'superscript':
+                if m.group()[-1] in '2²':
+                    value = 'SUPERSCRIPT_TWO'
+                else:
+                    value = 'SUPERSCRIPT_THREE'
+                if held is not None and held[2] == start:
+                    word, w_start, _ = held
+                    held = None
+                    if word + value in self._units:
+                        yield Token('unit', word + value, w_start, end)
+                        continue
+            if held is not None:
+                token = self._word_token(*held)
+                held = None
+                if token is not None:
+                    yield token
+
+            if kind == 'word':
+                held = (m.group().lower(), start, end)
+            elif kind == 'complex':
+                yield Token('unit', value, start, end)
+            elif kind == 'number':
+                yield Token('number', parse_number(m, exact), start, end)
+            else:
+                yield Token('superscript', value, start, end)
+
+        if held is not None:
+            token = self._word_token(*held)
+            if token is not None:
+                yield token
+
+    def unit_token(self, name):
+        """Return the token of a unit name, as if it was in a query (None if unknown)."""
+        token = name.lower()
+        if self.is_known(token):
+            return token
+        # maybe with a superscript, like 'm²' or 'ft^2'
+        tokens = list(self.tokenize(name))
+        if len(tokens) == 1 and tokens[0].kind == 'unit':
+            return tokens[0].value
+
+    def is_known(self, unit_token):
+        """Tell if the token is a unit name, symbol or synonym."""
+        return unit_token in self._units
+
+    def get_crossings(self, unit_token_from, unit_token_to):
+        """Return the info of all the compatible pairs of units for the tokens."""
+        # connectors may be here when the query has nothing else
+        base_units_from = self._units.get(unit_token_from, [])
+        base_units_to = self._units.get(unit_token_to, [])
         useful = []
         for b_u_from in base_units_from:
             for b_u_to in base_units_to:
                 mult_from, u_from = SUPPORTED_UNITS[b_u_from]
                 mult_to, u_to = SUPPORTED_UNITS[b_u_to]
                 if u_from.dimensionality == u_to.dimensionality:
-                    h_from_s, h_from_p = UNITS_OUTPUT[b_u_from]
-                    h_to_s, h_to_p = UNITS_OUTPUT[b_u_to]
-                    useful.append((UnitInfo(mult_from, u_from, h_from_s, h_from_p),
-                                   UnitInfo(mult_to, u_to, h_to_s, h_to_p)))
+                    h_from_s, h_from_p = self._units_output[b_u_from]
+                    h_to_s, h_to_p = self._units_output[b_u_to]
+                    useful.append((UnitInfo(b_u_from, mult_from, u_from, h_from_s, h_from_p),
+                                   UnitInfo(b_u_to, mult_to, u_to, h_to_s, h_to_p)))
+        return useful
+
+    def get_units_info(self, unit_token_from, unit_token_to):
+        """Return the info for the unit."""
+        useful = self.get_crossings(unit_token_from, unit_token_to)
 
         # return units info if there's a nice crossing and no ambiguity
         if len(useful) == 1:
             return useful[0]
 
-    def suggest(self, unit_token_from):
-        """Suggest a second destination unit."""
-        base_units_from = self._units[unit_token_from]
+    def suggest(self, unit_token_from, number=None):
+        """Suggest a second destination unit.
+
+        If the number is given and it's too big or too small in the default suggestion,
+        the unit is the one that best suits the value from the ladder of that suggestion.
+        """
+        base_units_from = self._units.get(unit_token_from, [])
         for b_u_from in base_units_from:
             if b_u_from in SUGGESTED_SECOND_UNIT:
-                return SUGGESTED_SECOND_UNIT[b_u_from]
+                suggested = SUGGESTED_SECOND_UNIT[b_u_from]
+                if number is None or suggested not in _suggestion_ladders:
+                    return suggested
+                base_unit, boundaries, units = _suggestion_ladders[suggested]
+                factor = _conversion_factor(b_u_from, base_unit)
+                return units[bisect.bisect_right(boundaries, abs(number) * factor)]
+
+
+unit_manager = _UnitManager(EXTRA_UNITS_INPUT, CONNECTORS, UNITS_OUTPUT)
+
+# the managers for other languages, loaded when first used
+_locale_managers = {}
+_locale_managers_lock = threading.Lock()
+
+
+def get_unit_manager(locale=None):
+    """Return the unit manager for the locale (English if None).
+
+    The vocabulary for each locale is in its module inside `unitconv.locales`.
+    """
+    if locale is None or locale == DEFAULT_LOCALE:
+        return unit_manager
+    try:
+        return _locale_managers[locale]
+    except KeyError:
+        pass
+
+    if not re.fullmatch(r"[a-z]{2}(_[a-z]{2})?", locale):
+        raise ValueError("Invalid locale: {!r}".format(locale))
+    with _locale_managers_lock:
+        if locale not in _locale_managers:
+            try:
+                pack = importlib.import_module('unitconv.locales.' + locale)
+            except ImportError:
+                raise ValueError("Unknown locale: {!r}".format(locale))
+            _locale_managers[locale] = _UnitManager(
+                pack.EXTRA_UNITS_INPUT, pack.CONNECTORS, pack.UNITS_OUTPUT)
+    return _locale_managers[locale]
+
+
+def _pint_convert(number, unit_from, unit_to):
+    """Convert the number between the units using pint (the reference implementation)."""
+    to_convert = _ureg.Quantity(number, unit_from.unit)
+    if unit_from.mult is not None:
+        to_convert *= unit_from.mult
+    converted = to_convert.to(unit_to.unit)
+    if unit_to.mult is not None:
+        converted /= unit_to.mult
+    return converted.magnitude
+
+
+@functools.lru_cache(maxsize=None)
+def _conversion_factor(name_from, name_to):
+    """Return the multiplier to go between the units, None if it's not linear.
+
+    It's calculated by pint once per pair of units, then cached.
+    """
+    unit_from = UnitInfo(name_from, *SUPPORTED_UNITS[name_from], None, None)
+    unit_to = UnitInfo(name_to, *SUPPORTED_UNITS[name_to], None, None)
+    if _pint_convert(0, unit_from, unit_to) != 0:
+        # an offset between the units, like in temperatures
+        return
+    return _pint_convert(1, unit_from, unit_to)
+
 
+@functools.lru_cache(maxsize=None)
+def _pint_factor(name_from, name_to):
+    """Return the multiplier between the pint units (without our multipliers), None if not linear.
+
+    It's calculated by pint once per pair of units, then cached.
+    """
+    unit_from = SUPPORTED_UNITS[name_from][1]
+    unit_to = SUPPORTED_UNITS[name_to][1]
+    if _ureg.Quantity(0, unit_from).to(unit_to).magnitude != 0:
+        # an offset between the units, like in temperatures
+        return
+    return _ureg.Quantity(1, unit_from).to(unit_to).magnitude
+
+
+def _fast_convert(number, unit_from, unit_to):
+    """Convert the number between the units with the cached factor, None if it's not linear.
+
+    The multipliers are applied around the factor in the same order that `_pint_convert`
+    does, so the floating point rounding is the same.
+    """
+    factor = _pint_factor(unit_from.name, unit_to.name)
+    if factor is None:
+        return
+    if unit_from.mult is not None:
+        number = number * unit_from.mult
+    converted = number * factor
+    if unit_to.mult is not None:
+        converted /= unit_to.mult
+    return converted
+
+
+def _build_suggestion_ladders():
+    """Return how to choose the unit in the ladder of each suggested unit.
+
+    For each unit of the ladders, the base unit of its ladder (the smallest one) is stored,
+    with the values in that base unit where the chosen unit changes, and the units to use
+    between those values; so choosing the unit is just a bisection.
+    """
+    low, high = SUGGESTION_BEST_RANGE
+    kept_low, kept_high = SUGGESTION_KEPT_RANGE
+    ladders = {}
+    for ladder in SUGGESTION_LADDERS:
+        base_unit = ladder[0]
+        factors = [_conversion_factor(name, base_unit) for name in ladder]
+
+        # from where each unit fits better than the previous one: when the value gets in the
+        # best range for both, or if there is a gap, when it's equally far at both sides
+        best = [min(big * low, math.sqrt(small * big * low * high))
+                for small, big in zip(factors, factors[1:])]
+
+        for name, factor in zip(ladder, factors):
+            kept = (factor * kept_low, factor * kept_high)
+            boundaries = sorted(set(best) | set(kept))
+            units = []
+            for value in [boundaries[0] / 2] + boundaries:
+                if kept[0] <= value < kept[1]:
+                    units.append(name)
+                else:
+                    units.append(ladder[bisect.bisect_right(best, value)])
+            ladders[name] = (base_unit, boundaries, units)
+    return ladders
+
+
+_suggestion_ladders = _build_suggestion_ladders()
+
+
+@functools.lru_cache(maxsize=None)
+def _exact_registry():
+    """Return a pint registry that works with rationals (it's slow to build, so only if needed)."""
+    return pint.UnitRegistry(non_int_type=fractions.Fraction)
+
+
+@functools.lru_cache(maxsize=None)
+def _exact_conversion(name_from, name_to):
+    """Return the exact scale and offset to go between the units.
+
+    It's calculated by pint (working with rationals) once per pair of units,
+    then cached.
+    """
+    ureg = _exact_registry()
+    mult_from, unit_from = SUPPORTED_UNITS[name_from]
+    mult_to, unit_to = SUPPORTED_UNITS[name_to]
+
+    def _convert(value):
+        quantity = ureg.Quantity(value, str(unit_from))
+        if mult_from is not None:
+            quantity *= fractions.Fraction(str(mult_from))
+        quantity = quantity.to(str(unit_to))
+        if mult_to is not None:
+            quantity /= fractions.Fraction(str(mult_to))
+        return fractions.Fraction(quantity.magnitude)
+
+    offset = _convert(fractions.Fraction(0))
+    return _convert(fractions.Fraction(1)) - offset, offset
+
+
+Divergence = collections.namedtuple("Divergence", "query number unit_from unit_to fast reference")
+
+
+class _ShadowVerifier(object):
+    """Check in background that the fast path gives the same results than pint."""
+
+    def __init__(self):
+        self.divergences = collections.deque(maxlen=1000)
+        self._queue = queue.Queue(maxsize=1000)
+        self._thread = None
+
+    def submit(self, query, number, unit_from, unit_to, fast_result):
+        """Queue a conversion to be verified; never blocks the caller."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        try:
+            self._queue.put_nowait((query, number, unit_from, unit_to, fast_result))
+        except queue.Full:
+            logger.debug("Shadow verification queue is full, dropping %r", query)
+
+    def _run(self):
+        """Process the queued conversions forever."""
+        while True:
+            divergence = self.verify(*self._queue.get())
+            if divergence is not None:
+                logger.warning("Fast path diverged from pint: %s", divergence)
+                self.divergences.append(divergence)
+            self._queue.task_done()
+
+    def verify(self, query, number, unit_from, unit_to, fast_result):
+        """Compare a conversion with the reference; return the Divergence, if any."""
+        reference = _pint_convert(number, unit_from, unit_to)
+        # what matters is what the user sees
+        if _nicer_number(fast_result, False) != _nicer_number(reference, False):
+            return Divergence(query, number, unit_from.name, unit_to.name, fast_result, reference)
 
-unit_manager = _UnitManager()
 
+_shadow = _ShadowVerifier()
+shadow_divergences = _shadow.divergences
+
+
+def verify_conversions(numbers=(1, 3, 7.5, 12.34, 1000, 0.0625, 1234550)):
+    """Compare the fast path against pint for every pair of supported units.
+
+    This is an offline exhaustive check; return the list of found divergences.
+    """
+    divergences = []
+    for name_from, name_to in itertools.product(SUPPORTED_UNITS, repeat=2):
+        unit_from = UnitInfo(name_from, *SUPPORTED_UNITS[name_from], None, None)
+        unit_to = UnitInfo(name_to, *SUPPORTED_UNITS[name_to], None, None)
+        if unit_from.unit.dimensionality != unit_to.unit.dimensionality:
+            continue
+        if _pint_factor(name_from, name_to) is None:
+            continue
+        for number in numbers:
+            fast_result = _fast_convert(number, unit_from, unit_to)
+            d = _shadow.verify(None, number, unit_from, unit_to, fast_result)
+            if d is not None:
+                divergences.append(d)
+    return divergences
+
+
+# the facts about numbers that may apply to each magnitude bucket (the decade of
+# the number), and the NUMBERS_INFO they were built from
+_numbers_info_buckets = (None, {})
+
+
+def _numbers_info_candidates(number):
+    """Return the facts that may apply to the number.
+
+    The buckets are built the first time, and again if NUMBERS_INFO is replaced.
+    """
+    global _numbers_info_buckets
+    facts, buckets = _numbers_info_buckets
+    if facts is not NUMBERS_INFO:
+        facts = NUMBERS_INFO
+        buckets = collections.defaultdict(list)
+        for fact in facts:
+            value = fact[0]
+            # the same range that is covered by the messages below
+            first = math.floor(math.log10(value * .4))
+            last = math.floor(math.log10(value * 100))
+            for bucket in range(first, last + 1):
+                buckets[bucket].append(fact)
+        buckets = dict(buckets)
+        _numbers_info_buckets = facts, buckets
+    return buckets.get(math.floor(math.log10(number)), [])
+
+
+def _numbers_info(number, seed=None):
+    """Provide useful/fun info about some numbers.
+
+    The info is chosen randomly between the best ones, unless a seed is given: then the
+    choice depends only on the number and the seed (consecutive int seeds rotate between
+    them, other seeds like a request id are hashed by their text).
+    """
+    if number <= 0:
+        return
 
-def _numbers_info(number):
-    """Provide useful/fun info about some numbers."""
     results = []
-    for value, unit, dimension, target in NUMBERS_INFO:
+    for value, unit, dimension, target in _numbers_info_candidates(number):
         msg = None
         vals = locals()
         if value * .4 <= number <= value * .6:
@@ -455,89 +974,225 @@ def _numbers_info(number):
             results.append((distance, text))
 
     if results:
-        return random.choice([x[1] for x in sorted(results)[:NUMBERS_UNCERTAINTY]])
+        choices = [x[1] for x in sorted(results)[:NUMBERS_UNCERTAINTY]]
+        if seed is None:
+            return random.choice(choices)
+        if not isinstance(seed, int):
+            seed = zlib.crc32(str(seed).encode('utf8'))
+        position = zlib.crc32(str(number).encode('ascii')) + seed
+        return choices[position % len(choices)]
 
 
-def parse_number(m):
-    """Return a float from a match of the regex above."""
+def parse_number(m, exact=False):
+    """Return a float from a match of the regex above, None if it's too big or small.
+
+    If exact, return an int or a Fraction instead of a float.
+
+    Numbers that don't fit in a float are discarded early, so absurd inputs
+    (like huge exponents) don't take long to be parsed.
+    """
     intpart, fracpart, expart = m.group('int', 'frac', 'exp')
+    if len(intpart.lstrip('0')) > MAX_NUMBER_DIGITS:
+        return
+    if expart and len(expart.lstrip('+-').lstrip('0')) > MAX_EXPONENT_DIGITS:
+        return
+    if exact and fracpart and len(fracpart) > MAX_NUMBER_DIGITS:
+        return
+
     if intpart:
         result = int(intpart)
     else:
         result = 0
     if fracpart:
-        result += float(fracpart) / 10 ** len(fracpart)
+        if exact:
+            result += fractions.Fraction(int(fracpart), 10 ** len(fracpart))
+        else:
+            result += float('0.' + fracpart)
     if expart:
-        result *= 10 ** int(expart)
+        if exact:
+            result *= fractions.Fraction(10) ** int(expart)
+        else:
+            result *= 10 ** int(expart)
+    try:
+        float(result)
+    except OverflowError:
+        return
     return result
 
 
-def convert(source):
-    """Parse and convert the units found in the source text."""
-    logger.debug("Input: %r", source)
-    text = source.strip().lower()
+def tokenize(source, locale=None):
+    """Return the useful tokens found in the source text, with their spans."""
+    return list(get_unit_manager(locale).tokenize(source))
 
-    # normalize square and cubic combinations
-    text = re.sub(r" *?\*\* *?2| *?\^ *?2|(?<=[a-zA-Z])2|²", 'SUPERSCRIPT_TWO', text)
-    text = re.sub(r" *?\*\* *?3| *?\^ *?3|(?<=[a-zA-Z])3|³", 'SUPERSCRIPT_THREE', text)
 
-    # replace the complex units to something useful
-    for cu, real in unit_manager.complex_units:
-        text = re.sub(cu, real, text)
-    logger.debug("Preconverted: %r", text)
+def _is_integer(number):
+    """Tell if the number (int, float or Fraction) has no fractional part."""
+    if isinstance(number, fractions.Fraction):
+        return number.denominator == 1
+    return isinstance(number, int) or number.is_integer()
 
-    m = re.search(RE_NUMBER, text, re.VERBOSE)
-    if not m:
-        logger.debug("OOPS, not number found")
-        return
-    number = parse_number(m)
-    num_start, num_end = m.span()
-    logger.debug("Number: %r  (limit=%s)", number, m.span())
 
+def _fraction_text(number, decimals=None):
+    """Return the decimal representation of the Fraction.
+
+    If decimals is None, use as many as needed to be exact; if that's not
+    possible (like 1/3), just return it as a fraction.
+    """
+    if decimals is None:
+        denominator = number.denominator
+        for factor in (2, 5):
+            while denominator % factor == 0:
+                denominator //= factor
+        if denominator != 1:
+            return str(number)
+        decimals = 0
+        while (number * 10 ** decimals).denominator != 1:
+            decimals += 1
+    scaled = round(number * 10 ** decimals)
+    sign = '-' if scaled < 0 else ''
+    intpart, fracpart = divmod(abs(scaled), 10 ** decimals)
+    return "{}{}.{:0{}d}".format(sign, intpart, fracpart, decimals)
+
+
+def _convert_tokens(manager, query, number, t_from, t_to, debug, exact):
+    """Convert the number between the units indicated by the tokens; return a Result."""
+    units_info = manager.get_units_info(t_from, t_to)
+    if units_info is None:
+        if debug:
+            logger.debug("OOPS, no matching units")
+        return Result(None, FailureReason.NO_MATCHING_UNITS)
+    return _convert_units(query, number, *units_info, debug, exact)
+
+
+def _nicer_number(number, exact):
+    """Return the converted number as shown to the user, rounded to 4 decimals."""
+    rounded = round(number, 4)
+    if _is_integer(rounded):
+        return str(int(rounded))
+    if exact:
+        nicer = _fraction_text(rounded, 4)
+    else:
+        nicer = "%.4f" % rounded
+    # as it's not an integer, remove extra 0s at the right
+    return nicer.rstrip('0')
+
+
+def _convert_units(query, number, unit_from, unit_to, debug, exact):
+    """Convert the number between the units; return a Result.
+
+    If exact the number must be an int or a Fraction, and the conversion is
+    done with rationals.
+    """
+    if exact:
+        scale, offset = _exact_conversion(unit_from.name, unit_to.name)
+        converted = number * scale + offset
+    else:
+        converted = _fast_convert(number, unit_from, unit_to)
+        if converted is None:
+            try:
+                converted = _pint_convert(number, unit_from, unit_to)
+            except pint.DimensionalityError:
+                if debug:
+                    logger.debug("OOPS, dimensionality error")
+                return Result(None, FailureReason.DIMENSIONALITY)
+        else:
+            if SHADOW_SAMPLE_RATE and random.random() < SHADOW_SAMPLE_RATE:
+                _shadow.submit(query, number, unit_from, unit_to, converted)
+    if debug:
+        logger.debug("Converted: %r", converted)
+
+    human_from, human_to = unit_from.human_plural, unit_to.human_plural
+
+    # care about result formatting
+    nicer_res = _nicer_number(converted, exact)
+    if nicer_res == '1':
+        human_to = unit_to.human_single
+    if debug:
+        logger.debug("Nicer number: %r", nicer_res)
+
+    # care about source formatting
+    if number == 1:
+        human_from = unit_from.human_single
+    if not isinstance(number, int) and _is_integer(number):
+        nicer_orig = str(int(number))
+    elif isinstance(number, fractions.Fraction):
+        nicer_orig = _fraction_text(number)
+    else:
+        nicer_orig = str(number)
+
+    return Result(human_from.format(nicer_orig) + ' = ' + human_to.format(nicer_res), None)
+
+
+def _convert(manager, source, debug, exact, seed):
+    """Parse and convert the units found in the source text; return a Result."""
+    if debug:
+        logger.debug("Input: %r", source)
+
+    number_token = None
     tokens = []
     found_tokens_before = False
-    for part in re.split(r'\W', text[:num_start], re.UNICODE):
-        for token in unit_manager.useful_tokens:
-            if part == token:
+    for token in manager.tokenize(source, exact):
+        if token.kind == 'number':
+            if number_token is None:
+                number_token = token
+        elif token.kind != 'superscript':
+            tokens.append(token.value)
+            if number_token is None:
                 found_tokens_before = True
-                tokens.append(token)
-                break
-    for part in re.split(r'\W', text[num_end:], re.UNICODE):
-        for token in unit_manager.useful_tokens:
-            if part == token:
-                tokens.append(token)
-    logger.debug("Tokens found: %s", tokens)
+
+    if number_token is None:
+        if debug:
+            logger.debug("OOPS, not number found")
+        return Result(None, FailureReason.NO_NUMBER)
+    number, num_start, num_end = number_token[1:]
+    if number is None:
+        if debug:
+            logger.debug("OOPS, invalid number")
+        return Result(None, FailureReason.INVALID_NUMBER)
+    if debug:
+        logger.debug("Number: %r  (limit=%s)", number, (num_start, num_end))
+        logger.debug("Tokens found: %s", tokens)
 
     if len(tokens) == 0:
         # only give number info if the number is alone
-        if num_end - num_start == len(text.strip()):
-            ni = _numbers_info(number)
+        if source[:num_start].strip() or source[num_end:].strip():
+            return Result(None, FailureReason.NO_UNITS)
+        # the facts about numbers are only in English (and approximate anyway)
+        if isinstance(number, fractions.Fraction):
+            number = int(number) if number.denominator == 1 else float(number)
+        ni = _numbers_info(number, seed) if manager is unit_manager else None
+        if debug:
             logger.debug("Numbers info: %r", ni)
-            return ni
-        else:
-            return
+        if ni is None:
+            return Result(None, FailureReason.NO_NUMBER_INFO)
+        # not always the same fact is chosen for the same source (unless seeded,
+        # see `convert_result`)
+        return Result(ni, None, False)
 
     if len(tokens) == 1:
         # suggest the second unit
-        suggested = unit_manager.suggest(tokens[0])
+        suggested = manager.suggest(tokens[0], number)
         if suggested is None:
-            return
+            return Result(None, FailureReason.NO_SUGGESTION)
 
         # use suggested unit and assure it's the destination one
-        logger.debug("Suggesting 2nd unit: %r", suggested)
+        if debug:
+            logger.debug("Suggesting 2nd unit: %r", suggested)
         tokens.append(suggested)
         found_tokens_before = False
 
     if len(tokens) > 2:
-        for conn in unit_manager.connectors:
+        for conn in manager.connectors:
             if conn in tokens:
                 tokens.remove(conn)
                 if len(tokens) == 2:
                     break
         else:
-            logger.debug("OOPS, not enough tokens")
-            return
-    logger.debug("Tokens filtered: %s", tokens)
+            if debug:
+                logger.debug("OOPS, not enough tokens")
+            return Result(None, FailureReason.TOO_MANY_UNITS)
+    if debug:
+        logger.debug("Tokens filtered: %s", tokens)
 
     if not found_tokens_before:
         # everything is after the number
@@ -546,64 +1201,534 @@ def convert(source):
     else:
         t_from_pos = 1
         t_to_pos = 0
-    logger.debug("Token selector: from=%s to=%s", t_from_pos, t_to_pos)
+    if debug:
+        logger.debug("Token selector: from=%s to=%s", t_from_pos, t_to_pos)
 
-    t_from = tokens[t_from_pos]
-    t_to = tokens[t_to_pos]
-    units_info = unit_manager.get_units_info(t_from, t_to)
-    if units_info is None:
-        logger.debug("OOPS, no matching units")
-        return
-    unit_from, unit_to = units_info
+    return _convert_tokens(
+        manager, source, number, tokens[t_from_pos], tokens[t_to_pos], debug, exact)
 
-    to_convert = _ureg.Quantity(number, unit_from.unit)
-    if unit_from.mult is not None:
-        to_convert *= unit_from.mult
-    try:
-        converted = to_convert.to(unit_to.unit)
-    except pint.unit.DimensionalityError:
-        logger.debug("OOPS, dimensionality error")
-        return
-    if unit_to.mult is not None:
-        converted /= unit_to.mult
-    logger.debug("Converted: %r", converted)
 
-    rounded = round(converted.magnitude, 4)
-    human_from, human_to = unit_from.human_plural, unit_to.human_plural
+def _merge_grouped_numbers(text, tokens):
+    """Return the tokens, with the numbers written with thousands separators merged."""
+    merged = []
+    groups = RE_GROUPED_NUMBER.finditer(text)
+    group = next(groups, None)
+    for token in tokens:
+        while group is not None and group.end() <= token.start:
+            group = next(groups, None)
+        if group is None or token.kind != 'number' or token.start < group.start():
+            merged.append(token)
+        elif token.start == group.start():
+            # the first piece of the group, the rest are just dropped
+            digits = group.group().replace(',', '')
+            if len(digits.split('.')[0]) > MAX_NUMBER_DIGITS:
+                value = None
+            else:
+                value = float(digits) if '.' in digits else int(digits)
+            merged.append(Token('number', value, group.start(), group.end()))
+    return merged
 
-    # care about result formatting
-    if isinstance(rounded, int) or rounded.is_integer():
-        if rounded == 1:
-            human_to = unit_to.human_single
-        nicer_res = str(int(rounded))
-    else:
-        nicer_res = "%.4f" % rounded
-        # as it's not an integer, remove extra 0s at the right
-        while nicer_res[-1] == '0':
-            nicer_res = nicer_res[:-1]
-    logger.debug("Nicer number: %r", nicer_res)
 
-    # care about source formatting
-    if number == 1:
-        human_from = unit_from.human_single
-    if isinstance(number, float) and number.is_integer():
-        nicer_orig = str(int(number))
+def _find_mentions(manager, text, debug):
+    """Yield the Mentions found in the text, relative to it."""
+    tokens = list(manager.tokenize(text))
+    if manager is unit_manager:
+        tokens = _merge_grouped_numbers(text, tokens)
+
+    # a connector right after a number may be a unit, like in 'it is 30 in wide'
+    for pos, token in enumerate(tokens[1:], 1):
+        if token.kind != 'connector' or not manager.is_known(token.value):
+            continue
+        previous = tokens[pos - 1]
+        if previous.kind != 'number' or text[previous.end:token.start].strip(' \t'):
+            continue
+        if pos + 1 < len(tokens) and tokens[pos + 1].kind == 'unit':
+            continue
+        tokens[pos] = token._replace(kind='unit')
+
+    for pos, token in enumerate(tokens):
+        if token.kind != 'number':
+            continue
+
+        # a number followed by a unit (only spaces between), optionally followed
+        # by a connector and the destination unit
+        used = []
+        end = token.end
+        for expected in ('unit', 'connector', 'unit'):
+            try:
+                following = tokens[pos + len(used) + 1]
+            except IndexError:
+                break
+            if following.kind != expected or text[end:following.start].strip(' \t'):
+                break
+            used.append(following)
+            end = following.end
+        if not used:
+            continue
+
+        t_from = used[0].value
+        if len(used) == 3:
+            t_to = used[2].value
+        else:
+            t_to = manager.suggest(t_from, token.value)
+            end = used[0].end
+        source = text[token.start:end]
+        if token.value is None:
+            result = Result(None, FailureReason.INVALID_NUMBER)
+        elif t_to is None:
+            result = Result(None, FailureReason.NO_SUGGESTION)
+        else:
+            result = _convert_tokens(manager, source, token.value, t_from, t_to, debug, False)
+        yield Mention(token.start, end, source, result)
+
+
+def scan(text_or_file, chunk_size=None, locale=None):
+    """Find and convert every quantity in a text (a string or an open file).
+
+    Yield Mentions, in order; the text is processed in chunks, so it can be
+    arbitrarily long.
+    """
+    if isinstance(text_or_file, str):
+        text_or_file = io.StringIO(text_or_file)
+    if chunk_size is None:
+        chunk_size = SCAN_CHUNK_SIZE
+    manager = get_unit_manager(locale)
+    debug = logger.isEnabledFor(logging.DEBUG)
+
+    offset = 0  # where the buffer starts in the whole text
+    buffer = ''
+    while True:
+        chunk = text_or_file.read(chunk_size)
+        buffer += chunk
+        if not chunk:
+            # the end, process everything that is left
+            for mention in _find_mentions(manager, buffer, debug):
+                yield mention._replace(start=mention.start + offset, end=mention.end + offset)
+            return
+
+        # process the buffer, but leave what is close to the end for next time;
+        # the cut is done in a whitespace to not break words or numbers, but
+        # never keeping more than the overlap (so the buffer doesn't grow)
+        limit = len(buffer) - SCAN_OVERLAP
+        cut = 0
+        for mention in _find_mentions(manager, buffer, debug):
+            if mention.start >= limit:
+                break
+            yield mention._replace(start=mention.start + offset, end=mention.end + offset)
+            cut = mention.end
+        if limit > cut:
+            start = max(cut, limit - SCAN_OVERLAP)
+            space = max(buffer.rfind(char, start, limit) for char in ' \t\r\n')
+            cut = limit if space == -1 else space
+        offset += cut
+        buffer = buffer[cut:]
+
+
+def convert_value(number, from_unit, to_unit, locale=None, exact=False):
+    """Convert the number between the units, avoiding all the parsing.
+
+    The units can be given by any of their names, symbols or synonyms. Return
+    the same human text than `convert`; raise ValueError if a unit is unknown,
+    or if the units are incompatible or ambiguous.
+
+    The number may be anything that converts to a finite float (like a Decimal
+    or a string), else ValueError is raised. If exact, it's converted to a
+    Fraction instead (pass it as int, Fraction, Decimal or string to avoid
+    binary floats) and the conversion is done with rationals.
+    """
+    manager = get_unit_manager(locale)
+    t_from, t_to = manager.unit_token(from_unit), manager.unit_token(to_unit)
+    for name, token in ((from_unit, t_from), (to_unit, t_to)):
+        if token is None:
+            raise ValueError("Unknown unit: {!r}".format(name))
+
+    crossings = manager.get_crossings(t_from, t_to)
+    if not crossings:
+        raise ValueError("Incompatible units: {!r} and {!r}".format(from_unit, to_unit))
+    if len(crossings) > 1:
+        options = ", ".join("{} to {}".format(u_from.name, u_to.name) for u_from, u_to in crossings)
+        raise ValueError("Ambiguous units: {!r} and {!r} (could be {})".format(
+            from_unit, to_unit, options))
+
+    if not isinstance(number, int):
+        try:
+            value = fractions.Fraction(number) if exact else float(number)
+        except (TypeError, ValueError, OverflowError):
+            value = None
+        if value is None or not (exact or math.isfinite(value)):
+            raise ValueError("Invalid number: {!r}".format(number))
+        number = value
+    debug = logger.isEnabledFor(logging.DEBUG)
+    query = "{} {} to {}".format(number, from_unit, to_unit)
+    return _convert_units(query, number, *crossings[0], debug, exact).text
+
+
+# a hash of what defines the results (the code, vocabularies, and pint)
+_results_fingerprint = client.results_fingerprint
+
+
+class _SharedCache(object):
+    """A results cache in a memory mapped file, shared by all the processes using it.
+
+    It's a fixed size open addressing table. Every entry has a checksum, so
+    entries half written (or written at the same time by other processes)
+    are just ignored when read. The first entry is a header identifying the
+    code that produced the results, so a file from other release is refused.
+    """
+
+    # checksum, key hash, kind of value, key length, value length
+    _entry_header = struct.Struct('<IQBHH')
+
+    # the kind of the stored values
+    _EMPTY = 0
+    _TEXT = 1
+    _FAILURE = 2
+
+    def __init__(self, path, entries):
+        self._entries = entries
+        size = (entries + 1) * SHARED_CACHE_ENTRY_SIZE
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+        try:
+            # others must not be able to plant results for us
+            info = os.fstat(fd)
+            if info.st_uid != os.getuid() or info.st_mode & 0o077:
+                raise ValueError("The cache in {!r} is not private to the user".format(path))
+            current_size = info.st_size
+            if current_size == 0:
+                os.ftruncate(fd, size)
+            elif current_size != size:
+                raise ValueError("The cache in {!r} has a different size".format(path))
+            self._mmap = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self._evict = 0
+
+        header = "unitconv cache {} {}\n".format(
+            _results_fingerprint(), SHARED_CACHE_ENTRY_SIZE).encode('ascii')
+        current_header = self._mmap[:len(header)]
+        if current_header == bytes(len(header)):
+            # just created (maybe by other process, that writes the same)
+            self._mmap[:len(header)] = header
+        elif current_header != header:
+            self._mmap.close()
+            raise ValueError("The cache in {!r} is from other version".format(path))
+
+    def _positions(self, key_hash):
+        """Return where the entry for the hash may be, in order."""
+        first = key_hash % self._entries
+        return [((first + i) % self._entries + 1) * SHARED_CACHE_ENTRY_SIZE
+                for i in range(SHARED_CACHE_PROBES)]
+
+    def get(self, key):
+        """Return the cached Result for the key, None if it's not there."""
+        key = key.encode('utf8')
+        key_hash = int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little')
+        size = self._entry_header.size
+        for pos in self._positions(key_hash):
+            entry = self._mmap[pos:pos + SHARED_CACHE_ENTRY_SIZE]
+            checksum, e_hash, kind, key_len, value_len = self._entry_header.unpack_from(entry)
+            if kind == self._EMPTY or e_hash != key_hash:
+                continue
+            end = size + key_len + value_len
+            if end > SHARED_CACHE_ENTRY_SIZE or zlib.crc32(entry[4:end]) != checksum:
+                continue
+            if entry[size:size + key_len] != key:
+                continue
+            value = entry[size + key_len:end].decode('utf8')
+            if kind == self._TEXT:
+                return Result(value, None)
+            return Result(None, FailureReason(value))
+
+    def put(self, key, result):
+        """Store the Result for the key (if it fits)."""
+        key = key.encode('utf8')
+        key_hash = int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little')
+        if result.failure is None:
+            kind, value = self._TEXT, result.text.encode('utf8')
+        else:
+            kind, value = self._FAILURE, result.failure.value.encode('utf8')
+        header = self._entry_header.pack(0, key_hash, kind, len(key), len(value))
+        data = header[4:] + key + value
+        if len(data) + 4 > SHARED_CACHE_ENTRY_SIZE:
+            return
+        data = zlib.crc32(data).to_bytes(4, 'little') + data
+
+        # use an empty entry or the one with the same key, else evict one
+        positions = self._positions(key_hash)
+        for pos in positions:
+            _, e_hash, kind, _, _ = self._entry_header.unpack_from(self._mmap, pos)
+            if kind == self._EMPTY or e_hash == key_hash:
+                break
+        else:
+            self._evict = (self._evict + 1) % SHARED_CACHE_PROBES
+            pos = positions[self._evict]
+        self._mmap[pos:pos + len(data)] = data
+
+    def close(self):
+        """Release the memory map."""
+        self._mmap.close()
+
+
+_shared_cache = None
+
+
+def enable_shared_cache(path=None, entries=None):
+    """Start using a results cache shared by all the processes that enable it in the same path.
+
+    By default the cache is in a file per user and version in shared memory
+    (or the temp dir); all the processes using the same file must use the
+    same entries.
+    """
+    global _shared_cache
+    if path is None:
+        base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+        path = os.path.join(base, 'unitconv-{}-{}.cache'.format(
+            os.getuid(), _results_fingerprint()))
+    if entries is None:
+        entries = SHARED_CACHE_ENTRIES
+    disable_shared_cache()
+    _shared_cache = _SharedCache(path, entries)
+
+
+def disable_shared_cache():
+    """Stop using the shared results cache."""
+    global _shared_cache
+    if _shared_cache is not None:
+        _shared_cache.close()
+        _shared_cache = None
+
+
+def convert_result(source, locale=None, exact=False, seed=None):
+    """Parse and convert the units found in the source text.
+
+    Return a Result with the human text, or the reason of the failure. If
+    exact, numbers are parsed as ints or Fractions and the conversion is done
+    with rationals (no binary rounding artifacts). If a seed is given (like
+    a request id), the info about a number alone is always the same for the
+    same seed (for a rotation, use an int counter).
+    """
+    manager = get_unit_manager(locale)
+    cache = _shared_cache
+    if MAX_INPUT_LENGTH is not None and len(source) > MAX_INPUT_LENGTH:
+        result = Result(None, FailureReason.INPUT_TOO_LONG)
     else:
-        nicer_orig = str(number)
+        # the seed only matters for the results that are not the same for the
+        # same source (the info about numbers), so only those have it in the key
+        # (with its repr, as an int and its text choose differently)
+        key = "{}:{}:{}".format(locale or DEFAULT_LOCALE, int(exact), source)
+        seeded_key = None if seed is None else "{}:{}/{!r}:{}".format(
+            locale or DEFAULT_LOCALE, int(exact), seed, source)
+        result = None
+        if cache is not None:
+            result = cache.get(key)
+            if result is None and seeded_key is not None:
+                result = cache.get(seeded_key)
+        if result is None:
+            result = _convert(manager, source, logger.isEnabledFor(logging.DEBUG), exact, seed)
+            if not result.deterministic and seed is not None:
+                result = result._replace(deterministic=True)
+                key = seeded_key
+            if cache is not None and result.deterministic:
+                cache.put(key, result)
+    failure_counts[result.failure] += 1
+    return result
+
+
+def convert(source, locale=None, exact=False, seed=None):
+    """Parse and convert the units found in the source text."""
+    return convert_result(source, locale, exact, seed).text
+
+
+class _DaemonHandler(socketserver.StreamRequestHandler):
+    """Answer the query received in the connection."""
+
+    def handle(self):
+        """Read one line with the query and write the response."""
+        line = self.rfile.readline(DAEMON_MAX_REQUEST)
+        query = line.decode('utf8', errors='replace').rstrip('\n')
+        self.wfile.write(str(convert(query)).encode('utf8'))
+
+
+def _get_server(socket_path):
+    """Return the daemon's server, listening in the socket."""
+    # the socket must be in a directory that only the user can touch
+    socket_dir = os.path.dirname(socket_path)
+    try:
+        os.mkdir(socket_dir, 0o700)
+    except FileExistsError:
+        pass
+    if not client.is_private(socket_dir):
+        raise RuntimeError("The directory {!r} is not private to the user".format(socket_dir))
+
+    if os.path.lexists(socket_path):
+        # leftover from a previous daemon? (if that one is still alive, don't steal it)
+        if client.query_daemon("", socket_path) is not None:
+            raise RuntimeError("The daemon is already running in {!r}".format(socket_path))
+        os.remove(socket_path)
+
+    previous_umask = os.umask(0o077)  # only the user can talk to the daemon
+    try:
+        return socketserver.ThreadingUnixStreamServer(socket_path, _DaemonHandler)
+    finally:
+        os.umask(previous_umask)
+
+
+def serve(socket_path=None):
+    """Run as a daemon, converting the queries received through a Unix socket."""
+    if socket_path is None:
+        socket_path = client.get_socket_path()
+    server = _get_server(socket_path)
+    server.daemon_threads = True
+
+    # exit nicely (removing the socket) when killed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit())
+
+    logger.info("Serving in %r", socket_path)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(socket_path)
 
-    return human_from.format(nicer_orig) + ' = ' + human_to.format(nicer_res)
+
+def _query_template(query):
+    """Return the query with its numbers replaced by '#', to group the similar ones."""
+    parts = []
+    previous = 0
+    for token in unit_manager.tokenize(query):
+        if token.kind == 'number':
+            parts.append(query[previous:token.start])
+            parts.append('#')
+            previous = token.end
+    parts.append(query[previous:])
+    return " ".join("".join(parts).lower().split())
+
+
+def _profiled_names():
+    """Return the qualified names of this module's functions and methods, by their first line."""
+    names = {}
+    for obj in list(globals().values()):
+        if isinstance(obj, type) and obj.__module__ == __name__:
+            candidates = vars(obj).values()
+        else:
+            candidates = [obj]
+        for candidate in candidates:
+            candidate = getattr(candidate, '__wrapped__', candidate)  # the cached ones
+            code = getattr(candidate, '__code__', None)
+            if code is not None and code.co_filename == __file__:
+                names[code.co_firstlineno] = candidate.__qualname__
+    return names
+
+
+def profile_log(log_path, output_path=None):
+    """Replay the queries of a log (one per line) through `convert` under the profiler.
+
+    Return the time spent by function (all of pint is grouped together) and by query
+    template (the numbers are replaced by '#'), most expensive first. If an output path is
+    given, the report is also written there as JSON, to be compared between releases.
+    """
+    with open(log_path, encoding='utf8', errors='replace') as fh:
+        queries = [line.strip() for line in fh]
+    queries = [query for query in queries if query]
+
+    profiler = cProfile.Profile()
+    durations = []
+    profiler.enable()
+    for query in queries:
+        started = time.perf_counter()
+        convert(query)
+        durations.append(time.perf_counter() - started)
+    profiler.disable()
+
+    names = _profiled_names()
+    pint_dir = os.path.dirname(pint.__file__) + os.sep
+    functions = []
+    pint_calls = pint_own = pint_cumulative = 0
+    stats = pstats.Stats(profiler).stats
+    for (filename, lineno, funcname), (_, calls, own, cumulative, callers) in stats.items():
+        if filename == __file__:
+            name = names.get(lineno, "{} (line {})".format(funcname, lineno))
+            functions.append({
+                'name': name, 'calls': calls, 'own_time': own, 'cumulative_time': cumulative})
+        elif filename.startswith(pint_dir):
+            # all the time inside pint, and the calls (and their time) from our code
+            pint_own += own
+            for caller, (_, caller_calls, _, caller_cumulative) in callers.items():
+                if caller[0] == __file__:
+                    pint_calls += caller_calls
+                    pint_cumulative += caller_cumulative
+    if pint_calls:
+        functions.append({
+            'name': 'pint', 'calls': pint_calls, 'own_time': pint_own,
+            'cumulative_time': pint_cumulative})
+    functions.sort(key=lambda item: (-item['cumulative_time'], item['name']))
+
+    templates = {}
+    for query, duration in zip(queries, durations):
+        template = _query_template(query)
+        if template not in templates:
+            templates[template] = {'template': template, 'queries': 0, 'total_time': 0}
+        templates[template]['queries'] += 1
+        templates[template]['total_time'] += duration
+    templates = sorted(
+        templates.values(), key=lambda item: (-item['total_time'], item['template']))
+
+    report = {
+        'queries': len(queries),
+        'total_time': sum(durations),
+        'functions': functions,
+        'templates': templates,
+    }
+    if output_path is not None:
+        with open(output_path, 'w', encoding='utf8') as fh:
+            json.dump(report, fh, indent=2, sort_keys=True)
+    return report
+
+
+def _format_profile(report):
+    """Return the profile report as text for humans."""
+    lines = ["Replayed {} queries in {:.3f} seconds".format(
+        report['queries'], report['total_time'])]
+    lines.append("")
+    lines.append("Hotspots by function (cumulative secs, own secs, calls):")
+    for item in report['functions'][:PROFILE_TOP]:
+        lines.append("  {:10.4f} {:10.4f} {:9d}  {}".format(
+            item['cumulative_time'], item['own_time'], item['calls'], item['name']))
+    lines.append("")
+    lines.append("Hotspots by query template (total secs, mean msecs, queries):")
+    for item in report['templates'][:PROFILE_TOP]:
+        lines.append("  {:10.4f} {:10.4f} {:9d}  {}".format(
+            item['total_time'], 1000 * item['total_time'] / item['queries'], item['queries'],
+            item['template']))
+    return "\n".join(lines)
 
 
 USAGE = """
 Usage: unitconv <expression>
    ej: unitconv 42 km to miles
+
+       unitconv --daemon
+   to keep running and serve the conversions to next calls
+
+       unitconv profile <logfile> [<output.json>]
+   to replay the queries of the log (one per line) and report where the time
+   is spent (the report is also written as JSON, by default next to the log)
 """
 
 
 def main():
     """Main entry point to run as script. Use `convert` instead if as module."""
     params = sys.argv[1:]
-    if params:
+    if params == ['--daemon']:
+        serve()
+    elif params[:1] == ['profile'] and len(params) in (2, 3):
+        log_path = params[1]
+        output_path = params[2] if len(params) == 3 else log_path + '.profile.json'
+        print(_format_profile(profile_log(log_path, output_path)))
+        print("\nProfile written to {!r}".format(output_path))
+    elif params:
         print(convert(" ".join(params)))
     else:
         print(USAGE)
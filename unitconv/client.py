@@ -0,0 +1,93 @@
+# Copyright 2020 Facundo Batista
+# For further info, check  https://github.com/facundobatista/unitconv
+
+"""Client to talk to the daemon.
+
+This module only uses the standard library and nothing else from the package,
+so the script can load it without paying for pint and the units structures.
+"""
+
+import functools
+import hashlib
+import importlib.util
+import os
+import socket
+import tempfile
+
+# how long to wait for the daemon before falling back to convert in-process
+TIMEOUT = 5
+
+
+@functools.lru_cache(maxsize=None)
+def results_fingerprint():
+    """Return a hash of what defines the results: the package's code and vocabularies, and pint.
+
+    Pint is not imported (that is slow), the names, sizes and times of its files are used.
+    """
+    digest = hashlib.blake2b(digest_size=8)
+    for dirpath, _, filenames in sorted(os.walk(os.path.dirname(__file__))):
+        for filename in sorted(filenames):
+            if filename.endswith('.py'):
+                with open(os.path.join(dirpath, filename), 'rb') as fh:
+                    digest.update(fh.read())
+
+    pint_dir = os.path.dirname(importlib.util.find_spec('pint').origin)
+    for dirpath, _, filenames in sorted(os.walk(pint_dir)):
+        for filename in sorted(filenames):
+            if filename.endswith(('.py', '.txt')):
+                info = os.stat(os.path.join(dirpath, filename))
+                digest.update("{} {} {}\n".format(
+                    os.path.join(dirpath, filename), info.st_size, info.st_mtime_ns).encode('utf8'))
+    return digest.hexdigest()
+
+
+def get_socket_path():
+    """Return the path of the daemon's socket, in a directory private to the user.
+
+    The socket is specific to the version, so after an upgrade a daemon still
+    running with the previous one is not used.
+    """
+    base = os.environ.get('XDG_RUNTIME_DIR')
+    if not base:
+        base = os.path.join(tempfile.gettempdir(), 'unitconv-{}'.format(os.getuid()))
+    return os.path.join(base, 'unitconv-{}.sock'.format(results_fingerprint()))
+
+
+def is_private(path):
+    """Tell if the path belongs to the user, and nobody else can access it."""
+    try:
+        info = os.lstat(path)
+    except OSError:
+        return False
+    return info.st_uid == os.getuid() and not info.st_mode & 0o077
+
+
+def query_daemon(query, socket_path=None):
+    """Return the daemon's response to the query, None if it can't be reached.
+
+    The daemon is only trusted if its socket and the directory holding it are
+    private to the user (otherwise somebody else may be answering).
+    """
+    if socket_path is None:
+        socket_path = get_socket_path()
+    if not (is_private(os.path.dirname(socket_path)) and is_private(socket_path)):
+        return
+    query = query.replace('\n', ' ')
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(TIMEOUT)
+    try:
+        sock.connect(socket_path)
+        sock.sendall(query.encode('utf8') + b'\n')
+        parts = []
+        while True:
+            data = sock.recv(4096)
+            if not data:
+                break
+            parts.append(data)
+    except OSError:
+        return
+    finally:
+        sock.close()
+    if parts:
+        return b''.join(parts).decode('utf8')
@@ -0,0 +1,9 @@
+# Copyright 2020 Facundo Batista
+# For further info, check  https://github.com/facundobatista/unitconv
+
+"""Vocabularies for languages other than English, one module per locale.
+
+Each module holds the same structures (with the same meaning) than the main
+module: EXTRA_UNITS_INPUT, CONNECTORS and UNITS_OUTPUT; they are loaded only
+when the locale is used.
+"""
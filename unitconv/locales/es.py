@@ -0,0 +1,170 @@
+# Copyright 2020 Facundo Batista
+# For further info, check  https://github.com/facundobatista/unitconv
+
+"""Spanish vocabulary."""
+
+# synonyms, abbreviations, and other names for same unit; and also
+# multi-word conversions
+EXTRA_UNITS_INPUT = [
+    ('acre', 'acre'),
+    ('acres', 'acre'),
+    ('área', 'are'),
+    ('áreas', 'are'),
+    ('centímetro', 'centimeter'),
+    ('centímetro cúbico', 'cubic_centimeter'),
+    ('centímetro cuadrado', 'square_centimeter'),
+    ('centímetros', 'centimeter'),
+    ('centímetros cúbicos', 'cubic_centimeter'),
+    ('centímetros cuadrados', 'square_centimeter'),
+    ('cucharada', 'tablespoon'),
+    ('cucharadas', 'tablespoon'),
+    ('cucharadita', 'teaspoon'),
+    ('cucharaditas', 'teaspoon'),
+    ('cuarto de galón', 'quart'),
+    ('cuartos de galón', 'quart'),
+    ('día', 'day'),
+    ('días', 'day'),
+    ('galón', 'gallon'),
+    ('galones', 'gallon'),
+    ('gramo', 'gram'),
+    ('gramos', 'gram'),
+    ('grano', 'grain'),
+    ('granos', 'grain'),
+    ('hectárea', 'hectare'),
+    ('hectáreas', 'hectare'),
+    ('hora', 'hour'),
+    ('horas', 'hour'),
+    ('kilo', 'kilogram'),
+    ('kilogramo', 'kilogram'),
+    ('kilogramos', 'kilogram'),
+    ('kilómetro', 'kilometer'),
+    ('kilómetro cúbico', 'cubic_kilometer'),
+    ('kilómetro cuadrado', 'square_kilometer'),
+    ('kilómetros', 'kilometer'),
+    ('kilómetros cúbicos', 'cubic_kilometer'),
+    ('kilómetros cuadrados', 'square_kilometer'),
+    ('kilos', 'kilogram'),
+    ('libra', 'pound'),
+    ('libras', 'pound'),
+    ('litro', 'litre'),
+    ('litros', 'litre'),
+    ('mes', 'month'),
+    ('meses', 'month'),
+    ('metro', 'meter'),
+    ('metro cúbico', 'cubic_meter'),
+    ('metro cuadrado', 'square_meter'),
+    ('metros', 'meter'),
+    ('metros cúbicos', 'cubic_meter'),
+    ('metros cuadrados', 'square_meter'),
+    ('miligramo', 'milligram'),
+    ('miligramos', 'milligram'),
+    ('mililitro', 'millilitre'),
+    ('mililitros', 'millilitre'),
+    ('milla', 'mile'),
+    ('milla cúbica', 'cubic_mile'),
+    ('milla cuadrada', 'square_mile'),
+    ('millas', 'mile'),
+    ('millas cúbicas', 'cubic_mile'),
+    ('millas cuadradas', 'square_mile'),
+    ('minuto', 'minute'),
+    ('minutos', 'minute'),
+    ('onza', 'fluid_ounce'),
+    ('onza', 'ounce'),
+    ('onza líquida', 'fluid_ounce'),
+    ('onzas', 'fluid_ounce'),
+    ('onzas', 'ounce'),
+    ('onzas líquidas', 'fluid_ounce'),
+    ('pie', 'foot'),
+    ('pie cúbico', 'cubic_foot'),
+    ('pie cuadrado', 'square_foot'),
+    ('pies', 'foot'),
+    ('pies cúbicos', 'cubic_foot'),
+    ('pies cuadrados', 'square_foot'),
+    ('pinta', 'pint'),
+    ('pintas', 'pint'),
+    ('pulgada', 'inch'),
+    ('pulgada cúbica', 'cubic_inch'),
+    ('pulgada cuadrada', 'square_inch'),
+    ('pulgadas', 'inch'),
+    ('pulgadas cúbicas', 'cubic_inch'),
+    ('pulgadas cuadradas', 'square_inch'),
+    ('segundo', 'second'),
+    ('segundos', 'second'),
+    ('semana', 'week'),
+    ('semanas', 'week'),
+    ('taza', 'cup'),
+    ('tazas', 'cup'),
+    ('tonelada', 'metric_ton'),
+    ('tonelada corta', 'short_ton'),
+    ('toneladas', 'metric_ton'),
+    ('toneladas cortas', 'short_ton'),
+    ('yarda', 'yard'),
+    ('yarda cúbica', 'cubic_yard'),
+    ('yarda cuadrada', 'square_yard'),
+    ('yardas', 'yard'),
+    ('yardas cúbicas', 'cubic_yard'),
+    ('yardas cuadradas', 'square_yard'),
+    ('año', 'year'),
+    ('años', 'year'),
+]
+
+# human unit representation for outputs to the user
+UNITS_OUTPUT = {
+    'acre': ('{} acre', '{} acres'),
+    'are': ('{} área', '{} áreas'),
+    'celsius': ('{}°C', '{}°C'),
+    'centimeter': ('{} centímetro', '{} centímetros'),
+    'cubic_centimeter': ('{} centímetro cúbico', '{} centímetros cúbicos'),
+    'cubic_foot': ('{} pie cúbico', '{} pies cúbicos'),
+    'cubic_inch': ('{} pulgada cúbica', '{} pulgadas cúbicas'),
+    'cubic_kilometer': ('{} kilómetro cúbico', '{} kilómetros cúbicos'),
+    'cubic_meter': ('{} metro cúbico', '{} metros cúbicos'),
+    'cubic_mile': ('{} milla cúbica', '{} millas cúbicas'),
+    'cubic_yard': ('{} yarda cúbica', '{} yardas cúbicas'),
+    'cup': ('{} taza US', '{} tazas US'),
+    'day': ('{} día', '{} días'),
+    'fahrenheit': ('{}°F', '{}°F'),
+    'fluid_ounce': ('{} onza líquida US', '{} onzas líquidas US'),
+    'foot': ('{} pie', '{} pies'),
+    'gallon': ('{} galón US', '{} galones US'),
+    'grain': ('{} grano', '{} granos'),
+    'gram': ('{} gramo', '{} gramos'),
+    'hectare': ('{} hectárea', '{} hectáreas'),
+    'hour': ('{} hora', '{} horas'),
+    'inch': ('{} pulgada', '{} pulgadas'),
+    'kelvin': ('{}K', '{}K'),
+    'kilogram': ('{} kilogramo', '{} kilogramos'),
+    'kilometer': ('{} kilómetro', '{} kilómetros'),
+    'litre': ('{} litro', '{} litros'),
+    'meter': ('{} metro', '{} metros'),
+    'metric_ton': ('{} tonelada', '{} toneladas'),
+    'mile': ('{} milla', '{} millas'),
+    'milligram': ('{} miligramo', '{} miligramos'),
+    'millilitre': ('{} mililitro', '{} mililitros'),
+    'minute': ('{} minuto', '{} minutos'),
+    'month': ('{} mes', '{} meses'),
+    'ounce': ('{} onza', '{} onzas'),
+    'pint': ('{} pinta US', '{} pintas US'),
+    'pound': ('{} libra', '{} libras'),
+    'quart': ('{} cuarto de galón', '{} cuartos de galón'),
+    'second': ('{} segundo', '{} segundos'),
+    'square_centimeter': ('{} centímetro cuadrado', '{} centímetros cuadrados'),
+    'square_foot': ('{} pie cuadrado', '{} pies cuadrados'),
+    'square_inch': ('{} pulgada cuadrada', '{} pulgadas cuadradas'),
+    'square_kilometer': ('{} kilómetro cuadrado', '{} kilómetros cuadrados'),
+    'square_meter': ('{} metro cuadrado', '{} metros cuadrados'),
+    'square_mile': ('{} milla cuadrada', '{} millas cuadradas'),
+    'square_yard': ('{} yarda cuadrada', '{} yardas cuadradas'),
+    'tablespoon': ('{} cucharada US', '{} cucharadas US'),
+    'teaspoon': ('{} cucharadita US', '{} cucharaditas US'),
+    'short_ton': ('{} tonelada corta', '{} toneladas cortas'),
+    'week': ('{} semana', '{} semanas'),
+    'yard': ('{} yarda', '{} yardas'),
+    'year': ('{} año', '{} años'),
+}
+
+# normal connectors in user input
+CONNECTORS = [
+    'a',
+    'en',
+]
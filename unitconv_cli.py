@@ -0,0 +1,43 @@
+# Copyright 2020 Facundo Batista
+# For further info, check  https://github.com/facundobatista/unitconv
+
+"""Script entry point, that forwards the query to the daemon if it's running.
+
+This module is outside the package and is light in imports on purpose, so
+talking to the daemon doesn't pay for loading pint and building the units
+structures; if the daemon is not there the conversion is done in-process.
+"""
+
+import importlib.util
+import os
+import sys
+
+
+def _load_client():
+    """Load the package's daemon client without importing the package itself (that is heavy)."""
+    package_dir = importlib.util.find_spec('unitconv').submodule_search_locations[0]
+    spec = importlib.util.spec_from_file_location(
+        'unitconv_client', os.path.join(package_dir, 'client.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+client = _load_client()
+
+
+def main():
+    """Main entry point to run as script."""
+    params = sys.argv[1:]
+    if params and not params[0].startswith('-') and params[0] != 'profile':
+        response = client.query_daemon(" ".join(params))
+        if response is not None:
+            print(response)
+            return
+
+    import unitconv
+    unitconv.main()
+
+
+if __name__ == '__main__':
+    main()